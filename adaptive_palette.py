@@ -0,0 +1,103 @@
+# adaptive_palette.py
+"""
+从图片中提取自适应调色板。
+    extract_palette(img, n)                          自由选取 n 种颜色（MiniBatchKMeans 或中位切分）
+    extract_palette(img, n, subset_of=WPLACE_PALETTE) 从给定调色板中挑出最适合这张图的 n 种
+大图先做分层网格采样（最多约 MAX_SAMPLES 个像素），结果按 (图像指纹, n, 约束, 方法) 缓存；
+同一张图换个 n 重新聚类时用上一次的聚类中心热启动。
+"""
+from __future__ import annotations
+from typing import List, Tuple, Optional, Sequence
+from collections import OrderedDict
+import hashlib
+import math
+
+import numpy as np
+from PIL import Image
+
+from lazy_imports import lazy_import
+from palette_engine import rgb_to_oklab
+
+sklearn_cluster = lazy_import("sklearn.cluster")  # 首次聚类时才导入 scikit-learn
+
+MAX_SAMPLES = 65536
+METHODS = ["kmeans", "mediancut"]
+_CACHE_SIZE = 64
+
+_palette_cache: "OrderedDict[tuple, List[Tuple[int, int, int]]]" = OrderedDict()
+_warm_centers: "OrderedDict[str, np.ndarray]" = OrderedDict()  # 图像指纹 → 上次的聚类中心（按簇大小降序）
+
+# -------------------- 采样 --------------------
+
+def sample_pixels(img: Image.Image, max_samples: int = MAX_SAMPLES) -> np.ndarray:
+    """分层网格采样：按原图宽高比缩到约 max_samples 个格子，每格取一个像素（邻近采样，保留原有颜色）。"""
+    scale = min(1.0, math.sqrt(max_samples / max(1, img.width * img.height)))
+    gw, gh = max(1, round(img.width * scale)), max(1, round(img.height * scale))
+    small = img if (gw, gh) == img.size else img.resize((gw, gh), Image.Resampling.NEAREST)
+    return np.asarray(small.convert("RGB"), dtype=np.uint8).reshape(-1, 3)
+
+def image_fingerprint(img: Image.Image, samples: Optional[np.ndarray] = None) -> str:
+    """用尺寸 + 采样像素做指纹，避免对几千万像素整体求哈希。"""
+    samples = sample_pixels(img) if samples is None else samples
+    h = hashlib.blake2b(digest_size=16); h.update(f"{img.size}{img.mode}".encode()); h.update(samples.tobytes())
+    return h.hexdigest()
+
+def _unique_colors(samples: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    packed = (samples[:, 0].astype(np.uint32) << 16) | (samples[:, 1].astype(np.uint32) << 8) | samples[:, 2]
+    uniq, counts = np.unique(packed, return_counts=True)
+    return np.stack([uniq >> 16, (uniq >> 8) & 0xFF, uniq & 0xFF], axis=1).astype(np.uint8), counts
+
+# -------------------- 提取 --------------------
+
+def _kmeans(samples: np.ndarray, n: int, warm: Optional[np.ndarray]) -> np.ndarray:
+    data = samples.astype(np.float64)
+    if warm is not None and len(warm) >= n: init = warm[:n]
+    elif warm is not None:
+        extra = data[np.random.default_rng(0).choice(len(data), n - len(warm), replace=len(data) < n - len(warm))]
+        init = np.vstack([warm, extra])
+    else: init = "k-means++"
+    km = sklearn_cluster.MiniBatchKMeans(n_clusters=n, init=init, n_init=1, batch_size=4096, max_no_improvement=10, random_state=0)
+    labels = km.fit_predict(data)
+    order = np.argsort(-np.bincount(labels, minlength=n))
+    return km.cluster_centers_[order]
+
+def _median_cut(samples: np.ndarray, n: int) -> np.ndarray:
+    img = Image.fromarray(samples.reshape(1, -1, 3))
+    q = img.quantize(colors=n, method=Image.Quantize.MEDIANCUT)
+    counts = np.bincount(np.asarray(q).ravel(), minlength=n)
+    pal = np.array(q.getpalette()[:3 * n], dtype=np.float64).reshape(-1, 3)
+    return pal[np.argsort(-counts[:len(pal)])]
+
+def _best_subset(samples: np.ndarray, base: Sequence[Tuple[int, int, int]], n: int) -> List[int]:
+    """贪心挑选 base 中的 n 种颜色，每一步加入能让样本（OKLab 下）总误差下降最多的颜色。"""
+    uniq, counts = _unique_colors(samples)  # 同色样本合并，用次数加权
+    d = ((rgb_to_oklab(uniq)[:, None, :] - rgb_to_oklab(np.asarray(base))[None, :, :]) ** 2).sum(-1)
+    chosen: List[int] = []; best = np.full(len(uniq), np.inf)
+    for _ in range(min(n, len(base))):
+        cost = (np.minimum(best[:, None], d) * counts[:, None]).sum(axis=0)
+        cost[chosen] = np.inf
+        k = int(cost.argmin()); chosen.append(k); best = np.minimum(best, d[:, k])
+    return sorted(chosen)
+
+def extract_palette(img: Image.Image, n: int, subset_of: Optional[Sequence[Tuple[int, int, int]]] = None,
+                    method: str = "kmeans") -> List[Tuple[int, int, int]]:
+    """返回 n 种颜色的调色板；subset_of 给定时只从其中挑选。相同参数的结果直接取缓存。"""
+    if n < 1: raise ValueError("颜色数必须为正")
+    if method not in METHODS: raise ValueError(f"未知的提取方法: {method}")
+    samples = sample_pixels(img)
+    fp = image_fingerprint(img, samples)
+    constraint = tuple(tuple(c) for c in subset_of) if subset_of is not None else None
+    key = (fp, n, constraint, None if constraint else method)
+    if key in _palette_cache: _palette_cache.move_to_end(key); return list(_palette_cache[key])
+
+    if constraint: palette = [tuple(constraint[k]) for k in _best_subset(samples, constraint, n)]
+    else:
+        n = min(n, len(_unique_colors(samples)[0]))  # 图里颜色比 n 少时不必硬凑
+        centers = _kmeans(samples, n, _warm_centers.get(fp)) if method == "kmeans" else _median_cut(samples, n)
+        if method == "kmeans":
+            _warm_centers[fp] = centers
+            while len(_warm_centers) > _CACHE_SIZE: _warm_centers.popitem(last=False)
+        palette = [tuple(int(v) for v in np.clip(np.rint(c), 0, 255)) for c in centers]
+    _palette_cache[key] = palette
+    while len(_palette_cache) > _CACHE_SIZE: _palette_cache.popitem(last=False)
+    return list(palette)
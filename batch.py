@@ -0,0 +1,161 @@
+# batch.py
+"""
+无界面批量像素化：python wplaceHelper.py batch "art/*.jpg" -w 64 128 --format png wpp -o out
+每个输入文件交给进程池中的一个任务，只解码一次再依次生成各个宽度，结果直接写盘。
+本模块及其依赖都不导入 PySide6。
+"""
+from __future__ import annotations
+from typing import List, Tuple, Optional, Dict, Any
+
+import os
+import sys
+import glob
+import time
+import argparse
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from PIL import Image
+
+from palette_engine import COLOR_SPACES
+from pixelation import (
+    PIPELINE_DOWNSCALE_FIRST, PIPELINE_LEGACY, DOWNSAMPLERS, ALGORITHMS, CUSTOM_PALETTE, AUTO_PALETTE, AUTO_WPLACE_PALETTE,
+    pixelate_image, preset_palette, parse_hex_palette, WPLACE_PALETTE
+)
+from lazy_imports import text_cell
+import project_format
+from project_format import Project
+
+ALGORITHM_CHOICES = {"nearest": ALGORITHMS[0], "floyd": ALGORITHMS[1], "atkinson": ALGORITHMS[2], "jjn": ALGORITHMS[3], "sierra": ALGORITHMS[4],
+                     "bayer": ALGORITHMS[5], "bluenoise": ALGORITHMS[6]}
+PIPELINE_CHOICES = {"downscale": PIPELINE_DOWNSCALE_FIRST, "legacy": PIPELINE_LEGACY}
+DOWNSAMPLER_CHOICES = {"box": DOWNSAMPLERS[0], "reduce": DOWNSAMPLERS[1]}
+PALETTE_CHOICES = {"wplace": "wplace", "preset16": "预设16", "preset32": "预设32", "preset64": "预设64"}
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="wplaceHelper.py batch", description="批量把图片像素化为 PNG 和/或 .wpp 项目")
+    ap.add_argument("inputs", nargs="+", help="输入图片路径或通配符（支持 **）")
+    ap.add_argument("-w", "--width", type=int, nargs="+", required=True, help="输出宽度，可给多个")
+    ap.add_argument("--height", type=int, default=None, help="固定输出高度；默认按原图宽高比计算")
+    ap.add_argument("-p", "--palette", choices=list(PALETTE_CHOICES), default="wplace", help="调色板预设")
+    ap.add_argument("--colors", default=None, help="自定义调色板，逗号/空格分隔的 #RRGGBB，优先于 --palette")
+    ap.add_argument("--auto-colors", type=int, default=None, metavar="N", help="从每张图片自动提取 N 色调色板，优先于 --palette/--colors")
+    ap.add_argument("--auto-subset", action="store_true", help="配合 --auto-colors：只从 wplace 调色板中挑选 N 色")
+    ap.add_argument("-a", "--algorithm", choices=list(ALGORITHM_CHOICES), default="nearest")
+    ap.add_argument("--strength", type=float, default=1.0, help="抖动强度 0-1")
+    ap.add_argument("--pipeline", choices=list(PIPELINE_CHOICES), default="downscale", help="legacy 下 nearest/floyd 沿用 PIL，忽略 --metric 与 --strength")
+    ap.add_argument("--downsampler", choices=list(DOWNSAMPLER_CHOICES), default="box")
+    ap.add_argument("--metric", choices=COLOR_SPACES, default="RGB", help="最近色的色差度量")
+    ap.add_argument("-f", "--format", choices=["png", "wpp"], nargs="+", default=["png"], help="输出格式，可同时输出两种")
+    ap.add_argument("-o", "--output-dir", default=".", help="输出目录")
+    ap.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="并行进程数，1 表示不开进程池")
+    return ap
+
+def expand_inputs(patterns: List[str]) -> List[str]:
+    # Windows 的 shell 不展开通配符，这里统一展开
+    out: Dict[str, None] = {}
+    for pat in patterns:
+        matches = sorted(glob.glob(pat, recursive=True)) or ([pat] if os.path.isfile(pat) else [])
+        for m in matches:
+            if os.path.isfile(m): out.setdefault(os.path.abspath(m))
+    return list(out)
+
+def output_stems(paths: List[str]) -> Dict[str, str]:
+    """每个输入的输出文件名前缀。主文件名重复时（不区分大小写）保留相对于公共目录的子目录，
+    仍然重复（同一目录下只有扩展名不同）再加上扩展名，避免不同输入写到同一个输出文件。"""
+    stems = {p: Path(p).stem for p in paths}
+    clashes = lambda: {s for s, n in Counter(v.lower() for v in stems.values()).items() if n > 1}
+    dup = clashes()
+    if dup:
+        try: root = os.path.commonpath([os.path.dirname(p) for p in paths])
+        except ValueError: root = None  # Windows 上跨盘符
+        for p in paths:
+            if stems[p].lower() in dup: stems[p] = str(Path(os.path.relpath(p, root)).with_suffix("")) if root else f"{Path(p).parent.name}_{stems[p]}"
+        dup = clashes()
+    for p in paths:
+        if stems[p].lower() in dup: stems[p] += "_" + Path(p).suffix.lstrip(".")
+    return stems
+
+def process_file(path: str, stem: str, widths: List[int], height: Optional[int], settings: Dict[str, Any],
+                 palette: List[Tuple[int, int, int]], out_dir: str, formats: List[str]) -> Dict[str, Any]:
+    """进程池任务：解码一次，按各个宽度像素化并写出结果（文件名以 stem 开头，可带子目录）。返回各阶段耗时，出错时带 error。"""
+    result: Dict[str, Any] = {"path": path, "outputs": [], "error": None}
+    t0 = time.perf_counter()
+    try:
+        img = Image.open(path); img.load()
+        result["load"] = time.perf_counter() - t0
+        if settings["palette_name"] in (AUTO_PALETTE, AUTO_WPLACE_PALETTE):  # 自动调色板按文件提取，随 .wpp 一起保存
+            from adaptive_palette import extract_palette
+            subset = WPLACE_PALETTE if settings["palette_name"] == AUTO_WPLACE_PALETTE else None
+            palette = extract_palette(img, len(palette), subset)
+            settings = dict(settings, custom_palette=palette)
+        if os.path.dirname(stem): os.makedirs(os.path.join(out_dir, os.path.dirname(stem)), exist_ok=True)
+        for W in widths:
+            H = height or max(1, int(W / (img.width / img.height)))
+            t = time.perf_counter()
+            model = pixelate_image(img, W, H, settings["algorithm"], palette, settings["pipeline"], settings["downsampler"], settings["color_metric"], settings["dither_strength"])
+            files = []
+            if "png" in formats:
+                files.append(os.path.join(out_dir, f"{stem}_{W}x{H}.png")); model.to_pil().save(files[-1])
+            if "wpp" in formats:
+                files.append(os.path.join(out_dir, f"{stem}_{W}x{H}.wpp"))
+                project = Project(dict(settings, width=W, height=H), path, model, np.zeros((H, W), dtype=bool))
+                project_format.save_project(files[-1], project)
+            result["outputs"].append((W, H, time.perf_counter() - t, files))
+    except Exception as e: result["error"] = f"{type(e).__name__}: {e}"
+    result["total"] = time.perf_counter() - t0
+    return result
+
+def _print_result(i: int, n: int, r: Dict[str, Any]):
+    name = Path(r["path"]).name
+    if r["error"]: print(f"[{i}/{n}] {name}  失败: {r['error']}", flush=True); return
+    sizes = ", ".join(f"{W}×{H} {dt * 1000:.0f}ms" for W, H, dt, _ in r["outputs"])
+    print(f"[{i}/{n}] {name}  解码 {r['load'] * 1000:.0f}ms | {sizes}", flush=True)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    inputs = expand_inputs(args.inputs)
+    if not inputs: print("没有找到匹配的输入图片", file=sys.stderr); return 2
+    if any(w < 1 for w in args.width) or (args.height is not None and args.height < 1): print("宽高必须为正整数", file=sys.stderr); return 2
+    if args.auto_colors is not None:
+        limit = len(WPLACE_PALETTE) if args.auto_subset else 256
+        if not 2 <= args.auto_colors <= limit: print(f"--auto-colors 必须在 2-{limit} 之间", file=sys.stderr); return 2
+        palette_name = AUTO_WPLACE_PALETTE if args.auto_subset else AUTO_PALETTE
+        palette = [(0, 0, 0)] * args.auto_colors  # 占位，只用来传递 N，真正的调色板在每个任务里提取
+    elif args.colors:
+        palette = parse_hex_palette(args.colors); palette_name = CUSTOM_PALETTE
+        if not palette: print("--colors 中没有解析到有效颜色", file=sys.stderr); return 2
+    else: palette_name = PALETTE_CHOICES[args.palette]; palette = preset_palette(palette_name)
+    if not 0 <= args.strength <= 1: print("--strength 必须在 0-1 之间", file=sys.stderr); return 2
+    settings = {"algorithm": ALGORITHM_CHOICES[args.algorithm], "dither_strength": args.strength, "pipeline": PIPELINE_CHOICES[args.pipeline], "downsampler": DOWNSAMPLER_CHOICES[args.downsampler],
+                "color_metric": args.metric, "palette_name": palette_name, "custom_palette": palette if palette_name == CUSTOM_PALETTE else None}
+    os.makedirs(args.output_dir, exist_ok=True)
+    stems = output_stems(inputs)
+    renamed = sum(1 for p in inputs if stems[p] != Path(p).stem)
+    if renamed: print(f"{renamed} 个输入的文件名与其他输入重复，输出按子目录/扩展名区分", flush=True)
+    task_args = [(p, stems[p], args.width, args.height, settings, palette, args.output_dir, args.format) for p in inputs]
+
+    t0, results = time.perf_counter(), []
+    jobs = max(1, min(args.jobs, len(inputs)))
+    print(f"{len(inputs)} 个文件 × {len(args.width)} 个宽度，{jobs} 个进程", flush=True)
+    if jobs == 1:
+        for i, ta in enumerate(task_args, 1): results.append(process_file(*ta)); _print_result(i, len(inputs), results[-1])
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(process_file, *ta) for ta in task_args]
+            for i, fut in enumerate(as_completed(futures), 1): results.append(fut.result()); _print_result(i, len(inputs), results[-1])
+    wall = time.perf_counter() - t0
+
+    print("\n耗时汇总")
+    print(text_cell("文件", 32, True) + text_cell("解码", 10) + text_cell("像素化+写出", 14) + text_cell("合计", 10))
+    for r in sorted(results, key=lambda r: r["path"]):
+        name = text_cell(Path(r["path"]).name, 32, True)
+        if r["error"]: print(name + text_cell("失败", 10)); continue
+        work = sum(o[2] for o in r["outputs"])
+        print(name + text_cell(f"{r['load'] * 1000:.0f}ms", 10) + text_cell(f"{work * 1000:.0f}ms", 14) + text_cell(f"{r['total'] * 1000:.0f}ms", 10))
+    busy = sum(r["total"] for r in results)
+    failed = sum(1 for r in results if r["error"])
+    print(f"共 {len(results)} 个文件，失败 {failed} 个；墙钟 {wall:.2f}s，累计 {busy:.2f}s，并行加速 {busy / wall if wall else 0:.1f}×")
+    return 1 if failed else 0
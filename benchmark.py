@@ -0,0 +1,168 @@
+# benchmark.py
+"""
+无界面性能基准：python wplaceHelper.py bench -m 1 12 48 -w 256 1000 -o bench.json
+用确定性的合成图片（1-48 MP）跑 算法 × 调色板 × 输出宽度 的全部组合，记录各阶段耗时、吞吐量和峰值内存，
+结果写成 JSON，--compare 旧结果.json 可以对比两个版本。
+默认每个组合在独立的子进程中运行，峰值常驻内存 (ru_maxrss) 才不会被前面的组合抬高；Windows 上没有 resource，只记录 tracemalloc 峰值
+（覆盖 NumPy 数组和 Python 对象，不含 PIL 图像内部的缓冲区）。
+--qt 额外在 offscreen 平台上测量 qimage_from_pil / qimage_from_indexed / QPixmap.fromImage，
+并校验转换结果逐像素一致、qimage_from_indexed 是否确实与索引缓冲区共享内存（零拷贝）。
+"""
+from __future__ import annotations
+from typing import List, Dict, Any, Optional
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import itertools
+import tracemalloc
+import multiprocessing
+
+import numpy as np
+from PIL import Image
+
+from pixelation import ALGORITHMS, PALETTE_PRESETS, StageTimer, pixelate_image, preset_palette
+from batch import PIPELINE_CHOICES
+from lazy_imports import text_cell
+
+try: import resource  # 仅 Unix
+except ImportError: resource = None
+
+DEFAULT_MEGAPIXELS = [1, 4, 12, 48]
+DEFAULT_WIDTHS = [128, 512, 1000]
+BENCH_VERSION = 1
+_QT_STAGES = {"qimage_from_pil", "QPixmap(原图)", "qimage_from_indexed", "QPixmap(结果)"}  # 不计入像素化吞吐量
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="wplaceHelper.py bench", description="像素化性能基准，结果写成 JSON")
+    ap.add_argument("-m", "--megapixels", type=float, nargs="+", default=DEFAULT_MEGAPIXELS, help="合成原图的像素数（百万），4:3")
+    ap.add_argument("-w", "--width", type=int, nargs="+", default=DEFAULT_WIDTHS, help="输出宽度，高度按原图宽高比")
+    ap.add_argument("-a", "--algorithm", nargs="+", choices=ALGORITHMS, default=ALGORITHMS, metavar="ALG", help="算法显示名，默认全部")
+    ap.add_argument("-p", "--palette", nargs="+", choices=PALETTE_PRESETS, default=PALETTE_PRESETS, help="调色板预设，默认全部")
+    ap.add_argument("--pipeline", choices=list(PIPELINE_CHOICES), default="downscale")
+    ap.add_argument("--metric", default="RGB", help="最近色的色差度量")
+    ap.add_argument("-r", "--repeat", type=int, default=1, help="每个组合重复次数，各阶段取最小值；≥2 时可排除首次建查找表等一次性开销")
+    ap.add_argument("--qt", action="store_true", help="同时测量并校验 QImage/QPixmap 转换（需要 PySide6）")
+    ap.add_argument("--in-process", action="store_true", help="所有组合在当前进程里跑（更快，但峰值常驻内存不准）")
+    ap.add_argument("-o", "--output", default="bench.json", help="结果 JSON 路径")
+    ap.add_argument("--compare", default=None, metavar="JSON", help="与之前保存的结果对比")
+    return ap
+
+# -------------------- 合成图片 --------------------
+
+def synthetic_image(megapixels: float, seed: int = 0) -> Image.Image:
+    """4:3 的确定性 RGB 测试图：低频随机色块双三次放大，再叠一层噪声，既有渐变也有细节。"""
+    w = max(1, round((megapixels * 1e6 * 4 / 3) ** 0.5)); h = max(1, round(w * 3 / 4))
+    rng = np.random.default_rng(seed)
+    img = Image.fromarray(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8)).resize((w, h), Image.Resampling.BICUBIC)
+    noise = Image.effect_noise((w, h), 24).convert("RGB")  # 直接在 PIL 里生成，不额外占用 NumPy 内存
+    return Image.blend(img, noise, 0.15)
+
+# -------------------- 单个组合 --------------------
+
+def _rss_peak_mb() -> Optional[float]:
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024  # macOS 单位是字节，Linux 是 KB
+
+def _qt_app():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtGui import QGuiApplication
+    return QGuiApplication.instance() or QGuiApplication([])
+
+def _qimage_array(qimg) -> np.ndarray:
+    """不拷贝地把 QImage 的像素缓冲区视为 H×bytesPerLine 的数组。"""
+    return np.frombuffer(qimg.constBits(), dtype=np.uint8, count=qimg.sizeInBytes()).reshape(qimg.height(), qimg.bytesPerLine())
+
+def _measure_qt(img: Image.Image, model, timer: StageTimer) -> Dict[str, Any]:
+    """测量界面线程上的转换，并校验：qimage_from_pil 逐像素一致（换成零拷贝实现后仍须通过），qimage_from_indexed 与索引缓冲区共享内存且颜色表正确。"""
+    _qt_app()
+    from PySide6.QtGui import QPixmap
+    from gui import qimage_from_pil, qimage_from_indexed
+    with timer.measure("qimage_from_pil"): src_q = qimage_from_pil(img)
+    with timer.measure("QPixmap(原图)"): QPixmap.fromImage(src_q)
+    with timer.measure("qimage_from_indexed"): q = qimage_from_indexed(model)
+    with timer.measure("QPixmap(结果)"): QPixmap.fromImage(q)
+    src_bytes = _qimage_array(src_q)[:, :img.width * 4].reshape(img.height, img.width, 4)
+    q_bytes = _qimage_array(q)
+    return {
+        "pil_matches": bool(np.array_equal(src_bytes, np.asarray(img.convert("RGBA")))),
+        "indexed_zero_copy": q_bytes.ctypes.data == model.buffer.ctypes.data,
+        "indexed_matches": bool(np.array_equal(q_bytes[:, :model.width], model.indices))
+                           and [c & 0xFFFFFF for c in q.colorTable()[:len(model.palette)]] == [(r << 16) | (g << 8) | b for r, g, b in model.palette],
+    }
+
+def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    """生成合成图并跑一个组合 repeat 次，各阶段取最小耗时；之后单独再跑一遍开着 tracemalloc 的，只取内存峰值
+    （tracemalloc 会让逐像素分配多的误差扩散慢好几倍，不能和计时放在同一遍）。"""
+    img = synthetic_image(case["megapixels"])
+    W = case["width"]; H = max(1, round(W * img.height / img.width))
+    palette = preset_palette(case["palette"])
+    run = lambda progress=None: pixelate_image(img, W, H, case["algorithm"], palette, case["pipeline"], metric=case["metric"], progress=progress)
+    rss_before = _rss_peak_mb()
+    best: Dict[str, float] = {}; qt = None
+    for _ in range(case["repeat"]):
+        timer = StageTimer()
+        model = run(timer)
+        timer("统计颜色"); model.color_counts(); timer.stop()
+        if case["qt"]: qt = _measure_qt(img, model, timer)
+        for name, dt in timer.as_dict().items(): best[name] = min(best.get(name, dt), dt)
+    tracemalloc.start()
+    try: run().color_counts(); traced_peak = tracemalloc.get_traced_memory()[1]
+    finally: tracemalloc.stop()
+    rss_after = _rss_peak_mb()
+    pipeline_s = sum(dt for name, dt in best.items() if name not in _QT_STAGES)
+    return dict(case, src_size=list(img.size), out_size=[W, H], stages_ms={k: round(v * 1000, 3) for k, v in best.items()},
+                total_ms=round(pipeline_s * 1000, 3), src_mpix_per_s=round(img.width * img.height / 1e6 / pipeline_s, 2) if pipeline_s else None,
+                out_mpix_per_s=round(W * H / 1e6 / pipeline_s, 3) if pipeline_s else None,
+                traced_peak_mb=round(traced_peak / (1 << 20), 1), rss_peak_mb=None if rss_after is None else round(rss_after, 1),
+                rss_growth_mb=None if rss_after is None else round(rss_after - rss_before, 1), qt=qt)
+
+def _run_isolated(case: Dict[str, Any]) -> Dict[str, Any]:
+    # 每个组合一个全新的子进程；spawn 保证不继承父进程已占用的内存，各平台行为一致
+    with multiprocessing.get_context("spawn").Pool(1, maxtasksperchild=1) as pool: return pool.apply(run_case, (case,))
+
+# -------------------- 汇总 --------------------
+
+def _key(r: Dict[str, Any]) -> tuple:
+    return (r["megapixels"], r["width"], r["algorithm"], r["palette"], r["pipeline"], r["metric"])
+
+def _print_row(r: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    mem = r["rss_peak_mb"] if r["rss_peak_mb"] is not None else r["traced_peak_mb"]
+    line = (text_cell(f"{r['megapixels']:g}MP", 7) + text_cell(f"{r['out_size'][0]}×{r['out_size'][1]}", 11) + "  " + text_cell(r["algorithm"], 26, True) + text_cell(r["palette"], 8, True)
+            + text_cell(f"{r['total_ms']:.0f}ms", 10) + text_cell(f"{r['src_mpix_per_s']}MP/s", 12) + text_cell(f"{mem:.0f}MB", 9))
+    if baseline: line += text_cell(f"{baseline['total_ms'] / r['total_ms']:.2f}×" if r["total_ms"] else "-", 9)
+    if r["qt"]: line += "  " + " ".join(f"{k}={'✓' if v else '✗'}" for k, v in r["qt"].items())
+    print(line, flush=True)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if min(args.megapixels) <= 0 or min(args.width) < 1 or args.repeat < 1: print("像素数、宽度和重复次数必须为正", file=sys.stderr); return 2
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f: baseline = {_key(r): r for r in json.load(f)["results"]}
+    cases = [{"megapixels": mp, "width": w, "algorithm": alg, "palette": pal, "pipeline": PIPELINE_CHOICES[args.pipeline], "metric": args.metric,
+              "repeat": args.repeat, "qt": args.qt}
+             for mp, w, alg, pal in itertools.product(args.megapixels, args.width, args.algorithm, args.palette)]
+    print(f"{len(cases)} 个组合（{len(args.megapixels)} 种原图 × {len(args.width)} 种宽度 × {len(args.algorithm)} 种算法 × {len(args.palette)} 种调色板）"
+          + ("，全部在当前进程" if args.in_process else "，每个组合一个子进程"), flush=True)
+    print(text_cell("原图", 7) + text_cell("输出", 11) + "  " + text_cell("算法", 26, True) + text_cell("调色板", 8, True) + text_cell("耗时", 10) + text_cell("原图吞吐", 12) + text_cell("峰值", 9)
+          + (text_cell("加速", 9) if baseline else ""), flush=True)
+    t0, results = time.perf_counter(), []
+    for case in cases:
+        r = run_case(case) if args.in_process else _run_isolated(case)
+        results.append(r); _print_row(r, baseline.get(_key(r)))
+    meta = {"version": BENCH_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(), "numpy": np.__version__,
+            "pillow": Image.__version__, "platform": platform.platform(), "cpu_count": os.cpu_count(), "isolated": not args.in_process,
+            "wall_s": round(time.perf_counter() - t0, 2)}
+    with open(args.output, "w", encoding="utf-8") as f: json.dump({"meta": meta, "results": results}, f, ensure_ascii=False, indent=1)
+    print(f"共 {len(results)} 个组合，墙钟 {meta['wall_s']}s，结果已写入 {args.output}")
+    failed = [r for r in results if r["qt"] and not all(r["qt"].values())]
+    if failed: print(f"{len(failed)} 个组合的 QImage 转换校验未通过", file=sys.stderr); return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+# canvas_diff.py
+"""
+把本地保存的画布截图/瓦片 PNG 与像素化结果逐像素比对，用来批量标记已经画好的像素。
+offset = (x, y) 是目标图左上角在截图中的位置，可以为负（目标只有一部分落在截图内）。
+截图中透明的像素（wplace 瓦片上未上色的位置）视为未绘制，永远不算匹配。
+只依赖 PIL/NumPy，整幅比对都是向量化运算。
+"""
+from __future__ import annotations
+from typing import Tuple
+
+import numpy as np
+from PIL import Image
+
+from indexed_image import IndexedImage
+
+class SnapshotDiff:
+    """比对结果。三个掩码都与目标图同尺寸：covered 截图覆盖到且不透明，matched 颜色一致，mismatched 覆盖到但颜色不一致。"""
+    def __init__(self, covered: np.ndarray, matched: np.ndarray):
+        self.covered, self.matched = covered, matched
+        self.mismatched = covered & ~matched
+
+    @property
+    def matched_count(self) -> int: return int(np.count_nonzero(self.matched))
+    @property
+    def mismatched_count(self) -> int: return int(np.count_nonzero(self.mismatched))
+    @property
+    def uncovered_count(self) -> int: return int(self.covered.size - np.count_nonzero(self.covered))
+
+    def mismatch_counts(self, model: IndexedImage) -> np.ndarray:
+        """按目标颜色统计不一致的像素数。"""
+        return np.bincount(model.indices[self.mismatched], minlength=len(model.palette))
+
+def _pack(rgb: np.ndarray) -> np.ndarray:
+    return (rgb[..., 0].astype(np.uint32) << 16) | (rgb[..., 1].astype(np.uint32) << 8) | rgb[..., 2]
+
+def compare_snapshot(model: IndexedImage, snapshot: Image.Image, offset: Tuple[int, int] = (0, 0), tolerance: int = 0) -> SnapshotDiff:
+    """tolerance 为 0 时要求颜色与目标调色板颜色完全相同，否则允许每个通道相差不超过 tolerance（应对截图的有损压缩/色彩管理）。"""
+    w, h = model.width, model.height
+    ox, oy = offset
+    # 目标图与截图重叠的区域（目标坐标系）
+    x0, y0 = max(0, -ox), max(0, -oy)
+    x1, y1 = min(w, snapshot.width - ox), min(h, snapshot.height - oy)
+    covered = np.zeros((h, w), dtype=bool); matched = np.zeros((h, w), dtype=bool)
+    if x1 <= x0 or y1 <= y0: return SnapshotDiff(covered, matched)
+    region = snapshot.crop((x0 + ox, y0 + oy, x1 + ox, y1 + oy))  # 先裁剪再转换，大瓦片也只转换用到的部分
+    rgba = np.asarray(region.convert("RGBA"))
+    opaque = rgba[..., 3] >= 128
+    target = model.indices[y0:y1, x0:x1]
+    if tolerance <= 0: same = _pack(rgba) == _pack(model.palette_array())[target]  # 先打包调色板再按索引取，省去 H×W×3 的中间数组
+    else: same = np.abs(rgba[..., :3].astype(np.int16) - model.palette_array()[target]).max(axis=-1) <= tolerance
+    covered[y0:y1, x0:x1] = opaque; matched[y0:y1, x0:x1] = opaque & same
+    return SnapshotDiff(covered, matched)
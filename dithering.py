@@ -0,0 +1,114 @@
+# dithering.py
+"""
+基于 NumPy 的抖动引擎，输入 H×W×3 的 RGB 数组，输出 H×W 的调色板索引。
+    有序抖动（Bayer / 蓝噪声）：阈值图平铺后整体加到图像上再查表匹配，完全向量化。
+    误差扩散（Floyd-Steinberg / Atkinson / JJN / Sierra）：按斜向波前调度——
+      像素 (x, y) 只依赖上方几行和左侧的像素，令 t = x + s·y（s 由扩散核决定），
+      同一个 t 上的像素互不依赖，一次向量化处理一整条波前，总步数 W + s·(H-1) 而不是 W·H。
+strength 缩放扩散的误差或有序抖动的阈值幅度，0 等价于不抖动。
+check 在误差扩散过程中每隔一段波前调用一次，可在其中抛出异常中止（像素化任务被取消时）。
+origin 是这块图在整幅输出中的位置，分块处理时让有序抖动的阈值图在块之间无缝衔接。
+"""
+from __future__ import annotations
+from typing import List, Tuple, Sequence, Optional, Callable
+from functools import lru_cache
+
+import numpy as np
+
+from palette_engine import get_palette_matcher
+
+# 扩散核：(dx, dy, 权重)，dy ≥ 0 且 dy == 0 时 dx > 0
+ERROR_KERNELS = {
+    "floyd-steinberg": [(1, 0, 7), (-1, 1, 3), (0, 1, 5), (1, 1, 1)],
+    "atkinson": [(1, 0, 1), (2, 0, 1), (-1, 1, 1), (0, 1, 1), (1, 1, 1), (0, 2, 1)],
+    "jjn": [(1, 0, 7), (2, 0, 5), (-2, 1, 3), (-1, 1, 5), (0, 1, 7), (1, 1, 5), (2, 1, 3), (-2, 2, 1), (-1, 2, 3), (0, 2, 5), (1, 2, 3), (2, 2, 1)],
+    "sierra": [(1, 0, 5), (2, 0, 3), (-2, 1, 2), (-1, 1, 4), (0, 1, 5), (1, 1, 4), (2, 1, 2), (-1, 2, 2), (0, 2, 3), (1, 2, 2)],
+}
+_KERNEL_DIVISORS = {"floyd-steinberg": 16, "atkinson": 8, "jjn": 48, "sierra": 32}  # Atkinson 有意只扩散 6/8 的误差
+ORDERED_METHODS = ["bayer", "bluenoise"]
+DITHER_METHODS = list(ERROR_KERNELS) + ORDERED_METHODS
+
+# -------------------- 阈值图 --------------------
+
+@lru_cache(maxsize=8)
+def bayer_matrix(n: int = 8) -> np.ndarray:
+    """n×n（n 为 2 的幂）的 Bayer 阈值图，取值均匀分布在 (-0.5, 0.5)。"""
+    m = np.zeros((1, 1))
+    while m.shape[0] < n: m = np.block([[4 * m, 4 * m + 2], [4 * m + 3, 4 * m + 1]])
+    return (m + 0.5) / m.size - 0.5
+
+@lru_cache(maxsize=2)
+def blue_noise(size: int = 64, sigma: float = 1.5, seed: int = 0) -> np.ndarray:
+    """用 void-and-cluster 生成 size×size 的可平铺蓝噪声阈值图，取值均匀分布在 (-0.5, 0.5)。首次约 0.1 秒，之后取缓存。"""
+    n = size * size
+    d = np.minimum(np.arange(size), size - np.arange(size))
+    g = np.exp(-(d[:, None] ** 2 + d[None, :] ** 2) / (2 * sigma ** 2))  # 环面上以 (0, 0) 为中心的高斯核
+    bump = lambda i: np.roll(g, divmod(int(i), size), axis=(0, 1))
+    pattern = np.zeros(n, dtype=bool); pattern[np.random.default_rng(seed).choice(n, n // 10, replace=False)] = True
+    energy = np.real(np.fft.ifft2(np.fft.fft2(pattern.reshape(size, size)) * np.fft.fft2(g))).reshape(-1)
+    for _ in range(n):  # 初始图案：反复把最密集的点挪到最大的空洞，直到不再变化
+        c = np.where(pattern, energy, -np.inf).argmax(); pattern[c] = False; energy -= bump(c).reshape(-1)
+        v = np.where(pattern, np.inf, energy).argmin(); pattern[v] = True; energy += bump(v).reshape(-1)
+        if v == c: break
+    rank, ones = np.empty(n, dtype=np.int64), int(pattern.sum())
+    p, e = pattern.copy(), energy.copy()
+    for r in range(ones - 1, -1, -1):  # 逐个移除最密集的点，排名从高到低
+        c = np.where(p, e, -np.inf).argmax(); p[c] = False; e -= bump(c).reshape(-1); rank[c] = r
+    p, e = pattern.copy(), energy.copy()
+    for r in range(ones, n):  # 逐个填补最大的空洞，排名从低到高
+        v = np.where(p, np.inf, e).argmin(); p[v] = True; e += bump(v).reshape(-1); rank[v] = r
+    return ((rank + 0.5) / n - 0.5).reshape(size, size)
+
+# -------------------- 抖动 --------------------
+
+def _spread(palette: Sequence[Tuple[int, int, int]]) -> float:
+    # 调色板颜色越多，相邻颜色越近，阈值幅度相应减小
+    return 255.0 / max(1.0, len(palette) ** (1 / 3))
+
+def ordered_dither(rgb: np.ndarray, palette: Sequence[Tuple[int, int, int]], method: str = "bayer",
+                   strength: float = 1.0, metric: str = "RGB", origin: Tuple[int, int] = (0, 0)) -> np.ndarray:
+    thresholds = bayer_matrix(8) if method == "bayer" else blue_noise()
+    h, w = rgb.shape[:2]; th, tw = thresholds.shape
+    t = thresholds[(np.arange(h)[:, None] + origin[1]) % th, (np.arange(w)[None, :] + origin[0]) % tw]
+    shifted = np.asarray(rgb, dtype=np.float32) + (t * (strength * _spread(palette))).astype(np.float32)[..., None]
+    return get_palette_matcher(palette, metric).match(np.clip(shifted + 0.5, 0, 255).astype(np.uint8))
+
+def _wavefront_slope(kernel: List[Tuple[int, int, int]]) -> int:
+    # 需要对所有 dy > 0 的项满足 dx + s·dy > 0，保证被扩散的像素落在更靠后的波前上
+    return max([1] + [(-dx) // dy + 1 for dx, dy, _ in kernel if dy > 0])
+
+def error_diffusion(rgb: np.ndarray, palette: Sequence[Tuple[int, int, int]], method: str = "floyd-steinberg",
+                    strength: float = 1.0, metric: str = "RGB", check: Optional[Callable[[], None]] = None) -> np.ndarray:
+    kernel, div = ERROR_KERNELS[method], _KERNEL_DIVISORS[method]
+    matcher = get_palette_matcher(palette, metric)
+    lut, shift, bits = matcher.lut, 8 - matcher.bits, matcher.bits
+    pal = matcher.palette.astype(np.float32)
+    h, w = rgb.shape[:2]
+    pad = max(abs(dx) for dx, _, _ in kernel); pad_y = max(dy for _, dy, _ in kernel)
+    buf = np.zeros((h + pad_y, w + 2 * pad, 3), dtype=np.float32)  # 四周留边，扩散时不必判断越界
+    buf[:h, pad:pad + w] = rgb
+    out = np.empty((h, w), dtype=np.uint8)
+    stride = buf.shape[1]; flat, out_flat = buf.reshape(-1, 3), out.reshape(-1)
+    weights = [(dy * stride + dx, np.float32(strength * wt / div)) for dx, dy, wt in kernel]  # 换算成线性位置偏移
+    s = _wavefront_slope(kernel)
+    for t in range(w + s * (h - 1)):
+        if check and not t % 64: check()
+        ys = np.arange(max(0, -((w - 1 - t) // s)), min(h - 1, t // s) + 1)
+        xs = t - s * ys
+        pos = ys * stride + xs + pad
+        vals = np.clip(flat[pos], 0, 255)
+        q = vals.astype(np.uint8) >> shift
+        idx = lut[(q[:, 0].astype(np.int32) << (2 * bits)) | (q[:, 1].astype(np.int32) << bits) | q[:, 2]]
+        out_flat[ys * w + xs] = idx
+        err = vals - pal[idx]
+        # 同一扩散项下，波前上各像素的目标互不相同，可以直接批量累加
+        for off, wt in weights: flat[pos + off] += err * wt
+    return out
+
+def dither(rgb: np.ndarray, palette: Sequence[Tuple[int, int, int]], method: str, strength: float = 1.0, metric: str = "RGB",
+           origin: Tuple[int, int] = (0, 0), check: Optional[Callable[[], None]] = None) -> np.ndarray:
+    """按 method 抖动并映射到调色板；strength ≤ 0 时退化为直接最近色匹配。"""
+    if method not in DITHER_METHODS: raise ValueError(f"未知的抖动方式: {method}")
+    if strength <= 0: return get_palette_matcher(palette, metric).match(np.asarray(rgb, dtype=np.uint8))
+    if method in ORDERED_METHODS: return ordered_dither(rgb, palette, method, strength, metric, origin)
+    return error_diffusion(rgb, palette, method, strength, metric, check)
@@ -0,0 +1,1145 @@
+# gui.py
+"""图形界面：像素画预览、标记、项目读写。像素化流程本身在 pixelation 模块中，不依赖 Qt。"""
+from __future__ import annotations
+from typing import List, Tuple, Optional, Set, Dict, Callable
+
+import os
+import sys
+import math
+import time
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from PySide6.QtCore import (
+    Qt, QRectF, QPointF, QLineF, QTimer, Signal, QObject, QRunnable, QThreadPool
+)
+from PySide6.QtGui import (
+    QAction, QActionGroup, QImage, QPainter, QPen, QBrush, QColor, QPixmap, QIcon, QKeySequence, QPolygonF
+)
+from PySide6.QtWidgets import (
+    QApplication, QMainWindow, QWidget, QFileDialog, QVBoxLayout, QHBoxLayout,
+    QPushButton, QLabel, QSpinBox, QComboBox, QCheckBox, QLineEdit, QMessageBox,
+    QGraphicsView, QGraphicsScene, QToolBar, QStatusBar, QMenu, QInputDialog,
+    QGraphicsItem,QSlider, QProgressBar, QDockWidget, QListWidget, QListWidgetItem,
+    QDialog, QDialogButtonBox, QFormLayout
+)
+
+from PIL import Image
+import numpy as np
+
+from palette_engine import COLOR_SPACES
+from indexed_image import IndexedImage
+from canvas_diff import compare_snapshot
+from mark_history import MarkHistory
+from lazy_imports import lazy_import
+from pixelation import (
+    PIPELINE_DOWNSCALE_FIRST, PIPELINE_LEGACY, DOWNSAMPLERS, ALGORITHMS, DITHER_ALGORITHMS, PALETTE_PRESETS, CUSTOM_PALETTE,
+    AUTO_PALETTE, AUTO_WPLACE_PALETTE, LEGACY_PIL_ALGORITHMS,
+    PixelateCancelled, StageTimer, pixelate_image, preset_palette, parse_hex_palette, WPLACE_PALETTE
+)
+
+project_format = lazy_import("project_format")  # 只在保存/加载项目时才需要
+tiled_canvas = lazy_import("tiled_canvas")  # 只在输出超过 LARGE_CANVAS_SIDE 或打开 .wpt 时才需要
+adaptive_palette = lazy_import("adaptive_palette")  # 只在选择“自动 N 色”时才需要
+
+LARGE_CANVAS_SIDE = 4096  # 输出宽或高超过它时按瓦片切分存成 .wpt，不再整幅放在内存里
+MAX_CANVAS_SIDE = 100000
+PIXELATE_STAGES = ["转换", "缩放", "量化", "生成预览"]
+
+# -------------------- 工具函数 --------------------
+
+def qimage_from_pil(img: Image.Image) -> QImage:
+    if img.mode != "RGBA": img = img.convert("RGBA")
+    return QImage(img.tobytes("raw", "RGBA"), img.width, img.height, QImage.Format_RGBA8888).copy()
+
+def qimage_from_indexed(model: IndexedImage) -> QImage:
+    """直接引用索引缓冲区的 Indexed8 QImage（零拷贝），调用方需保证 model 存活。"""
+    qimg = QImage(model.buffer.data, model.width, model.height, model.stride, QImage.Format_Indexed8)
+    qimg.setColorTable([0xFF000000 | (r << 16) | (g << 8) | b for r, g, b in model.palette])
+    return qimg
+
+def _is_canvas_path(path: Optional[str]) -> bool: return bool(path) and str(path).lower().endswith(".wpt")
+
+def hex_from_qcolor(c: QColor) -> str:
+    return "#%02X%02X%02X" % (c.red(), c.green(), c.blue())
+
+# -------------------- 自定义的覆盖层图形项 --------------------
+
+class OverlayItem(QGraphicsItem):
+    """标记/网格/悬停覆盖层。标记按 TILE×TILE 像素分块，按缩放级别缓存成 QPixmap，只绘制暴露区域内的块。"""
+    TILE = 32; CACHE_BYTES = 96 << 20; DIRECT_DRAW_SCALE = 16.0
+    MARK_RGBA = (220, 20, 60, 230)
+
+    def __init__(self, pixel_view: "PixelView", parent: QGraphicsItem | None = None):
+        super().__init__(parent)
+        self.view = pixel_view
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+        self._tile_cache: "OrderedDict[Tuple[int, int, float], QPixmap]" = OrderedDict(); self._cache_bytes = 0
+
+    def boundingRect(self) -> QRectF:
+        return QRectF(0, 0, self.view.output_w, self.view.output_h)
+
+    # ---- 失效 ----
+    def invalidate_all(self): self._tile_cache.clear(); self._cache_bytes = 0; self.update()
+    def invalidate_pixel(self, xy: Tuple[int, int]):
+        tx, ty = xy[0] // self.TILE, xy[1] // self.TILE
+        for key in [k for k in self._tile_cache if k[0] == tx and k[1] == ty]: self._drop(key)
+        self.update(self.pixel_rect(xy))
+    def invalidate_rect(self, x0: int, y0: int, x1: int, y1: int):
+        T = self.TILE; tx0, ty0, tx1, ty1 = x0 // T, y0 // T, (x1 - 1) // T, (y1 - 1) // T
+        for key in [k for k in self._tile_cache if tx0 <= k[0] <= tx1 and ty0 <= k[1] <= ty1]: self._drop(key)
+        self.update(self.area_rect(x0, y0, x1, y1))
+    def _drop(self, key):
+        pm = self._tile_cache.pop(key); self._cache_bytes -= pm.width() * pm.height() * 4
+    def pixel_rect(self, xy: Tuple[int, int]) -> QRectF: return self.area_rect(xy[0], xy[1], xy[0] + 1, xy[1] + 1)
+    def area_rect(self, x0: int, y0: int, x1: int, y1: int) -> QRectF:
+        # 外扩半个粗笔宽度（设备像素换算成场景单位），保证描边完整重绘
+        s = max(self.view.transform().m11(), 1e-3); m = 3.0 / s
+        return QRectF(x0 - m, y0 - m, x1 - x0 + 2 * m, y1 - y0 + 2 * m)
+
+    # ---- 绘制 ----
+    def _mark_pen(self) -> QPen:
+        pen = QPen(QColor(*self.MARK_RGBA)); pen.setWidthF(3.0); pen.setCosmetic(True); pen.setCapStyle(Qt.RoundCap)
+        return pen
+
+    @staticmethod
+    def _cross_lines(xs, ys, ox: float = 0, oy: float = 0) -> List[QLineF]:
+        margin, lines = 0.2, []
+        for x, y in zip((xs + ox).tolist(), (ys + oy).tolist()):
+            lines.append(QLineF(x + margin, y + margin, x + 1 - margin, y + 1 - margin))
+            lines.append(QLineF(x + 1 - margin, y + margin, x + margin, y + 1 - margin))
+        return lines
+
+    def _render_tile(self, tx: int, ty: int, scale: float) -> QPixmap:
+        T, mask = self.TILE, self.view.mark_mask
+        sub = mask[ty * T:(ty + 1) * T, tx * T:(tx + 1) * T]
+        th, tw = sub.shape
+        if scale < 3:
+            # 缩小时叉号本来就糊成一团，直接把掩码染色成 1:1 图块，由绘制时的缩放完成采样
+            rgba = np.zeros((th, tw, 4), dtype=np.uint8); rgba[sub] = self.MARK_RGBA
+            return QPixmap.fromImage(QImage(rgba.data, tw, th, tw * 4, QImage.Format_RGBA8888).copy())
+        pm = QPixmap(math.ceil(tw * scale), math.ceil(th * scale)); pm.fill(Qt.transparent)
+        ys, xs = np.nonzero(sub)
+        if len(xs):
+            p = QPainter(pm); p.setRenderHint(QPainter.Antialiasing, False); p.scale(pm.width() / tw, pm.height() / th)
+            p.setPen(self._mark_pen()); p.drawLines(self._cross_lines(xs, ys)); p.end()
+        return pm
+
+    def _tile(self, tx: int, ty: int, scale: float) -> QPixmap:
+        key = (tx, ty, scale if scale >= 3 else 0.0)
+        pm = self._tile_cache.get(key)
+        if pm is None:
+            pm = self._tile_cache[key] = self._render_tile(tx, ty, key[2]); self._cache_bytes += pm.width() * pm.height() * 4
+            while self._cache_bytes > self.CACHE_BYTES and len(self._tile_cache) > 1: self._drop(next(iter(self._tile_cache)))
+        else: self._tile_cache.move_to_end(key)
+        return pm
+
+    def paint(self, painter: QPainter, option, widget=None):
+        if not self.view.output_w: return
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        w, h = self.view.output_w, self.view.output_h
+        scale = round(painter.worldTransform().m11(), 4)
+        exposed = option.exposedRect if option is not None else QRectF(0, 0, w, h)
+        left, top, right, bottom = max(0, int(exposed.left())), max(0, int(exposed.top())), min(w, math.ceil(exposed.right())), min(h, math.ceil(exposed.bottom()))
+        if left >= right or top >= bottom: return
+        if self.view.show_grid and scale > 4:
+            pen = QPen(QColor(0,0,0,40)); pen.setWidth(0); pen.setCosmetic(True); painter.setPen(pen)
+            painter.drawLines([QLineF(x, top, x, bottom) for x in range(left, right + 1)] + [QLineF(left, y, right, y) for y in range(top, bottom + 1)])
+        mask = self.view.mark_mask
+        if mask is not None and mask[top:bottom, left:right].any():
+            if scale > self.DIRECT_DRAW_SCALE:
+                # 放得很大时视口内像素很少，直接画比缓存巨幅图块更省
+                ys, xs = np.nonzero(mask[top:bottom, left:right])
+                painter.setPen(self._mark_pen()); painter.drawLines(self._cross_lines(xs, ys, left, top))
+            else:
+                T = self.TILE
+                for ty in range(top // T, (bottom - 1) // T + 1):
+                    for tx in range(left // T, (right - 1) // T + 1):
+                        if not mask[ty * T:(ty + 1) * T, tx * T:(tx + 1) * T].any(): continue
+                        pm = self._tile(tx, ty, scale)
+                        tw, th = min(T, w - tx * T), min(T, h - ty * T)
+                        painter.drawPixmap(QRectF(tx * T, ty * T, tw, th), pm, QRectF(0, 0, pm.width(), pm.height()))
+        if option is None: return  # 导出图片时只画标记，不带选区、悬停和选中框
+        outline = self.view.selection_outline()
+        if outline is not None:
+            pen = QPen(QColor(30, 144, 255, 230), 1.5, Qt.DashLine); pen.setCosmetic(True); painter.setPen(pen); painter.setBrush(QColor(30, 144, 255, 40)); painter.drawPolygon(outline)
+        if self.view.hovered_pixel and self.view.hovered_pixel != self.view.selected_pixel:
+            x, y = self.view.hovered_pixel
+            pen = QPen(QColor(255,0,0,180), 1.5); pen.setCosmetic(True); painter.setPen(pen); painter.setBrush(Qt.NoBrush); painter.drawRect(QRectF(x, y, 1, 1))
+        if self.view.selected_pixel:
+            x, y = self.view.selected_pixel
+            pen = QPen(QColor(255,215,0,255), 2.0); pen.setCosmetic(True); painter.setPen(pen); painter.setBrush(Qt.NoBrush); painter.drawRect(QRectF(x, y, 1, 1))
+
+# -------------------- 超大画布瓦片图形项 --------------------
+
+class CanvasTileItem(QGraphicsItem):
+    """
+    超大画布的底图与标记。只读取与暴露区域相交的瓦片；缩小时按 2 的幂隔点取样，
+    让图块像素数与屏幕像素数相当，缓存按字节数限额，内存占用与画布总尺寸无关。
+    """
+    CACHE_BYTES = 128 << 20; CROSS_SCALE = 3.0; MAX_STEP = 64
+
+    def __init__(self, canvas: "tiled_canvas.TiledCanvas", parent: QGraphicsItem | None = None):
+        super().__init__(parent)
+        self.canvas = canvas
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+        self._color_table = [0xFF000000 | (r << 16) | (g << 8) | b for r, g, b in canvas.palette]
+        self._cache: "OrderedDict[Tuple[int, int, int, str], Optional[QPixmap]]" = OrderedDict(); self._cache_bytes = 0
+
+    def boundingRect(self) -> QRectF: return QRectF(0, 0, self.canvas.width, self.canvas.height)
+
+    def invalidate_marks(self, x0: int, y0: int, x1: int, y1: int, rect: QRectF):
+        tiles = set(self.canvas.tiles_in(x0, y0, x1, y1))
+        for key in [k for k in self._cache if k[:2] in tiles and k[3] == "m"]: self._drop(key)
+        self.update(rect)
+
+    def _drop(self, key):
+        pm = self._cache.pop(key)
+        if pm is not None: self._cache_bytes -= pm.width() * pm.height() * 4
+
+    def _render(self, i: int, j: int, step: int, kind: str) -> Optional[QPixmap]:
+        if kind == "c":
+            idx = np.ascontiguousarray(self.canvas.tile_indices(i, j)[::step, ::step])
+            qimg = QImage(idx.data, idx.shape[1], idx.shape[0], idx.shape[1], QImage.Format_Indexed8); qimg.setColorTable(self._color_table)
+            return QPixmap.fromImage(qimg)
+        sub = self.canvas.tile_marks(i, j)[::step, ::step]
+        if not sub.any(): return None  # 没有标记的瓦片只记一个空位，不占图块内存
+        rgba = np.zeros(sub.shape + (4,), dtype=np.uint8); rgba[sub] = OverlayItem.MARK_RGBA
+        return QPixmap.fromImage(QImage(rgba.data, sub.shape[1], sub.shape[0], sub.shape[1] * 4, QImage.Format_RGBA8888))
+
+    def _tile(self, i: int, j: int, step: int, kind: str) -> Optional[QPixmap]:
+        key = (i, j, step, kind)
+        if key in self._cache: self._cache.move_to_end(key); return self._cache[key]
+        pm = self._cache[key] = self._render(i, j, step, kind)
+        if pm is not None: self._cache_bytes += pm.width() * pm.height() * 4
+        while self._cache_bytes > self.CACHE_BYTES and len(self._cache) > 1: self._drop(next(iter(self._cache)))
+        return pm
+
+    def paint(self, painter: QPainter, option, widget=None):
+        c = self.canvas
+        scale = painter.worldTransform().m11()
+        exposed = option.exposedRect if option is not None else self.boundingRect()
+        left, top, right, bottom = int(exposed.left()), int(exposed.top()), math.ceil(exposed.right()), math.ceil(exposed.bottom())
+        step = 1
+        while step < self.MAX_STEP and scale * step * 2 <= 1: step *= 2
+        for i, j in c.tiles_in(left, top, right, bottom):
+            x0, y0, x1, y1 = c.tile_rect(i, j); target = QRectF(x0, y0, x1 - x0, y1 - y0)
+            pm = self._tile(i, j, step, "c"); painter.drawPixmap(target, pm, QRectF(pm.rect()))
+            if scale < self.CROSS_SCALE:
+                pm = self._tile(i, j, step, "m")
+                if pm is not None: painter.drawPixmap(target, pm, QRectF(pm.rect()))
+        if scale >= self.CROSS_SCALE:
+            # 放大后视口里的像素不多，直接按区域读标记画叉号
+            left, top, right, bottom = max(0, left), max(0, top), min(c.width, right), min(c.height, bottom)
+            ys, xs = np.nonzero(c.region_marks(left, top, right, bottom))
+            if len(xs):
+                pen = QPen(QColor(*OverlayItem.MARK_RGBA)); pen.setWidthF(3.0); pen.setCosmetic(True); pen.setCapStyle(Qt.RoundCap)
+                painter.setPen(pen); painter.drawLines(OverlayItem._cross_lines(xs, ys, left, top))
+
+# -------------------- 后台像素化任务 --------------------
+
+class PixelateSignals(QObject):
+    progress = Signal(int, str); finished = Signal(int, object); failed = Signal(int, str)
+    tiles = Signal(int, int, int)  # 大画布生成进度 (任务 id, 已完成瓦片数, 总数)
+
+class PixelateJob(QRunnable):
+    """在线程池中执行像素化，finished 发出 (IndexedImage, 各阶段耗时 StageTimer)；显示用的 QImage 由 GUI 线程零拷贝生成。"""
+    def __init__(self, job_id: int, img: Image.Image, *args):
+        super().__init__()
+        self.job_id, self.img, self.args = job_id, img, args
+        self.signals = PixelateSignals(); self._cancelled = threading.Event(); self.timer = StageTimer(self._report)
+        self.setAutoDelete(True)
+
+    def cancel(self): self._cancelled.set()
+
+    def _report(self, stage: str):
+        if self._cancelled.is_set(): raise PixelateCancelled()
+        self.signals.progress.emit(self.job_id, stage)
+
+    def run(self):
+        try:
+            model = pixelate_image(self.img, *self.args, progress=self.timer, cancelled=self._cancelled.is_set)
+            self.timer("生成预览"); model.color_counts(); self.timer.stop()
+            if not self._cancelled.is_set(): self.signals.finished.emit(self.job_id, (model, self.timer))
+        except PixelateCancelled: pass
+        except Exception as e: self.signals.failed.emit(self.job_id, str(e))
+
+class CanvasBuildJob(QRunnable):
+    """在线程池中逐瓦片生成 .wpt 大画布文件，完成后发出已打开的 TiledCanvas。"""
+    def __init__(self, job_id: int, path: str, img: Image.Image, *args):
+        super().__init__()
+        self.job_id, self.path, self.img, self.args = job_id, path, img, args
+        self.signals = PixelateSignals(); self._cancelled = threading.Event()
+        self.setAutoDelete(True)
+
+    def cancel(self): self._cancelled.set()
+
+    def _report(self, done: int, total: int):
+        if self._cancelled.is_set(): raise PixelateCancelled()
+        self.signals.tiles.emit(self.job_id, done, total)
+
+    def _remove_output(self):
+        try: os.remove(self.path)
+        except OSError: pass
+
+    def run(self):
+        try:
+            canvas = tiled_canvas.build_tiled_canvas(self.path, self.img, *self.args, progress=self._report)
+            if not self._cancelled.is_set(): self.signals.finished.emit(self.job_id, canvas); return
+            canvas.close(); self._remove_output()  # 最后一个瓦片之后才被取消
+        except PixelateCancelled: self._remove_output()  # 生成到一半的文件没有用处
+        except Exception as e: self.signals.failed.emit(self.job_id, str(e))
+
+# -------------------- 像素画视图 --------------------
+
+class PixelView(QGraphicsView):
+    colorChanged = Signal(str, int, int); hoverChanged = Signal(str, int, int)
+    markCountsChanged = Signal(int)  # 某个颜色索引的标记数变化；-1 表示全部重算
+    marksToggled = Signal(object)  # 用户切换了标记的像素线性位置数组 (y * W + x)
+    historyChanged = Signal()  # 撤销/重做栈变化
+    selectionChanged = Signal(int)  # 选区内的像素数，0 表示没有选区
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setRenderHint(QPainter.Antialiasing, False); self.setRenderHint(QPainter.SmoothPixmapTransform, False); self.setDragMode(QGraphicsView.NoDrag)
+        self.setViewportUpdateMode(QGraphicsView.MinimalViewportUpdate); self.setMouseTracking(True); self.setTransformationAnchor(QGraphicsView.NoAnchor); self.setResizeAnchor(QGraphicsView.NoAnchor)
+        self.scene = QGraphicsScene(self); self.setScene(self.scene)
+        self.pixmap_item, self.overlay_item, self.pixel_qimg = None, None, None
+        self.model: Optional[IndexedImage] = None  # 像素化结果；显示原图预览时为 None
+        self.canvas: Optional["tiled_canvas.TiledCanvas"] = None; self.canvas_item: Optional[CanvasTileItem] = None  # 超大画布模式
+        self.output_w, self.output_h = 0, 0
+        self.mark_mask: Optional[np.ndarray] = None  # H×W 布尔掩码，已标记为 True
+        self.marked_counts: Optional[np.ndarray] = None  # 每种颜色已标记的像素数，随 toggle_mark_at 增量更新
+        self.focus_color: Optional[int] = None; self.dim_item = None
+        self.selected_pixel, self.hovered_pixel, self.show_grid = None, None, False
+        self.history = MarkHistory()
+        self._visit_color: Optional[int] = None; self._visited: Set[int] = set()  # next_unmarked_of 本轮已到过的线性位置
+        self.select_mode: Optional[str] = None  # None / "rect" / "lasso"
+        self.selection: Optional[np.ndarray] = None; self.selection_bbox: Optional[Tuple[int, int, int, int]] = None  # 选区掩码只存外接矩形内的部分
+        self._selection_poly: Optional[QPolygonF] = None; self._sel_drag: Optional[List[QPointF]] = None
+        self._press_pos, self._panning, self._pan_timer = None, False, QTimer(self)
+        self._pan_timer.setSingleShot(True); self._pan_timer.timeout.connect(self._start_pan_by_timer)
+
+    def set_model(self, model: IndexedImage): self.set_image(qimage_from_indexed(model), model)
+
+    def drop_canvas(self):
+        if self.canvas_item is not None: self.scene.removeItem(self.canvas_item); self.canvas_item = None
+        if self.canvas is not None: self.canvas.close(); self.canvas = None  # 写回标记并释放映射
+
+    def set_canvas(self, canvas: "tiled_canvas.TiledCanvas"):
+        """切换到超大画布：不生成整幅 QImage，由 CanvasTileItem 按视口读取瓦片；标记直接写入映射文件。"""
+        self.drop_canvas()
+        self.model, self.pixel_qimg, self.mark_mask = None, None, None
+        self.canvas, self.output_w, self.output_h = canvas, canvas.width, canvas.height
+        if self.pixmap_item is not None: self.pixmap_item.setPixmap(QPixmap())
+        self.canvas_item = CanvasTileItem(canvas); self.scene.addItem(self.canvas_item)
+        if self.overlay_item is None: self.overlay_item = OverlayItem(self); self.scene.addItem(self.overlay_item)
+        else: self.overlay_item.prepareGeometryChange()
+        self.overlay_item.setZValue(1)
+        self.scene.setSceneRect(QRectF(0, 0, canvas.width, canvas.height)); self.resetTransform()
+        self.selected_pixel = None; self.hovered_pixel = None; self.set_focus_color(None); self._recount_marks(); self._reset_history(); self.overlay_item.invalidate_all()
+        self.fit_to_view()
+
+    def set_image(self, qimg: QImage, model: Optional[IndexedImage] = None):
+        self.drop_canvas()
+        self.model = model; self.pixel_qimg = qimg; self.output_w, self.output_h = qimg.width(), qimg.height()
+        pm = QPixmap.fromImage(qimg)
+        if self.pixmap_item is None: self.pixmap_item = self.scene.addPixmap(pm)
+        else: self.pixmap_item.setPixmap(pm)
+        if self.overlay_item is None: self.overlay_item = OverlayItem(self); self.scene.addItem(self.overlay_item)
+        else: self.overlay_item.setZValue(1); self.overlay_item.prepareGeometryChange()
+        self.scene.setSceneRect(QRectF(0, 0, pm.width(), pm.height())); self.resetTransform(); self.centerOn(self.pixmap_item)
+        self.overlay_item.setZValue(1)
+        self.mark_mask = np.zeros((qimg.height(), qimg.width()), dtype=bool)
+        self.selected_pixel = None; self.hovered_pixel = None; self.set_focus_color(None); self._recount_marks(); self._reset_history(); self.overlay_item.invalidate_all()
+
+    def _reset_history(self):
+        self.history.clear(); self.historyChanged.emit(); self.clear_selection(); self._visited.clear()
+
+    def _recount_marks(self):
+        if self.model is None: self.marked_counts = None
+        else: self.marked_counts = np.bincount(self.model.indices[self.mark_mask], minlength=len(self.model.palette))
+        self.markCountsChanged.emit(-1)
+
+    @property
+    def painted(self) -> Set[Tuple[int, int]]:
+        """已标记像素的 (x, y) 集合快照；需要逐像素遍历时用，热路径请直接读 mark_mask。"""
+        if self.mark_mask is None: return set()
+        ys, xs = np.nonzero(self.mark_mask)
+        return set(zip(xs.tolist(), ys.tolist()))
+
+    @painted.setter
+    def painted(self, marks):
+        if self.mark_mask is None: return
+        mask = np.zeros_like(self.mark_mask)
+        pts = np.array([tuple(p) for p in marks], dtype=np.int64).reshape(-1, 2)
+        h, w = mask.shape
+        pts = pts[(pts[:, 0] >= 0) & (pts[:, 0] < w) & (pts[:, 1] >= 0) & (pts[:, 1] < h)]
+        mask[pts[:, 1], pts[:, 0]] = True
+        self.set_mark_mask(mask)
+
+    def set_mark_mask(self, mask: np.ndarray):
+        if self.mark_mask is None or mask.shape != self.mark_mask.shape: raise ValueError("标记位图与图像尺寸不符")
+        self.mark_mask = np.array(mask, dtype=bool)
+        self._recount_marks(); self._reset_history()
+        if self.overlay_item: self.overlay_item.invalidate_all()
+
+    def bulk_set_marks(self, mask: np.ndarray, label: str = "批量标记") -> int:
+        """批量替换标记位图，变化的像素作为一步历史、一次重绘。返回变化的像素数。"""
+        if self.mark_mask is None or mask.shape != self.mark_mask.shape: raise ValueError("标记位图与图像尺寸不符")
+        changed = np.flatnonzero(self.mark_mask != mask)
+        self._apply_flips(changed, label)
+        return len(changed)
+
+    def _apply_flips(self, positions: np.ndarray, label: str = "", record: bool = True):
+        """
+        把一批互不重复的像素（线性位置 y * W + x）的标记各翻转一次。所有标记修改都走这里：
+        计数增量更新，覆盖层只重绘变化区域一次，可撤销的修改记入历史，内存项目还会通知自动保存日志。
+        """
+        pos = np.asarray(positions, dtype=np.int64)
+        if not len(pos): return
+        self._visited.clear()  # 标记变了，“下一个未标记像素”重新按距离找
+        ys, xs = np.divmod(pos, self.output_w)
+        x0, y0, x1, y1 = int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1
+        if self.canvas is not None:
+            self.canvas.flip_marks(xs, ys); self.canvas_item.invalidate_marks(x0, y0, x1, y1, self.overlay_item.area_rect(x0, y0, x1, y1))
+        else:
+            self.mark_mask[ys, xs] ^= True
+            if self.model is not None:
+                k, now, n = self.model.indices[ys, xs], self.mark_mask[ys, xs], len(self.model.palette)
+                self.marked_counts += np.bincount(k[now], minlength=n) - np.bincount(k[~now], minlength=n)
+                self.markCountsChanged.emit(int(k[0]) if len(pos) == 1 else -1)
+            if self.overlay_item:
+                if len(pos) == 1: self.overlay_item.invalidate_pixel((x0, y0))
+                else: self.overlay_item.invalidate_rect(x0, y0, x1, y1)
+            self.marksToggled.emit(pos.astype(np.uint32))
+        if record: self.history.push(pos, label); self.historyChanged.emit()
+
+    def undo(self) -> Optional[str]:
+        """撤销最近一步标记修改，返回它的说明；没有可撤销的步骤时返回 None。"""
+        delta = self.history.undo()
+        if delta is None: return None
+        self._apply_flips(delta.positions(), record=False); self.historyChanged.emit()
+        return delta.label
+
+    def redo(self) -> Optional[str]:
+        delta = self.history.redo()
+        if delta is None: return None
+        self._apply_flips(delta.positions(), record=False); self.historyChanged.emit()
+        return delta.label
+
+    # ---- 选区 ----
+    def set_select_mode(self, mode: Optional[str]):
+        self.select_mode = mode; self._sel_drag = None
+        self.setCursor(Qt.CrossCursor if mode else Qt.ArrowCursor)
+
+    def clear_selection(self):
+        had = self.selection is not None or self._sel_drag is not None
+        self.selection = self.selection_bbox = self._selection_poly = None; self._sel_drag = None
+        if had: self.selectionChanged.emit(0); self.overlay_item.update() if self.overlay_item else None
+
+    def selection_outline(self) -> Optional[QPolygonF]:
+        """正在拖拽的选框/套索，或已完成选区的轮廓（场景坐标）。"""
+        pts = self._sel_drag
+        if pts and len(pts) > 1:
+            if self.select_mode == "rect": return QPolygonF(QRectF(pts[0], pts[-1]).normalized())
+            return QPolygonF(pts)
+        return self._selection_poly
+
+    def _finish_selection(self, pts: List[QPointF]):
+        w, h = self.output_w, self.output_h
+        xs, ys = [p.x() for p in pts], [p.y() for p in pts]
+        x0, y0 = max(0, math.floor(min(xs))), max(0, math.floor(min(ys)))
+        x1, y1 = min(w, math.ceil(max(xs))), min(h, math.ceil(max(ys)))
+        if x1 <= x0 or y1 <= y0: self.clear_selection(); return
+        if self.select_mode == "rect":
+            mask = np.ones((y1 - y0, x1 - x0), dtype=bool); poly = QPolygonF(QRectF(x0, y0, x1 - x0, y1 - y0))
+        else:
+            # 套索：在外接矩形大小的画布上填充多边形，像素中心落在多边形内即选中
+            from PIL import ImageDraw
+            img = Image.new("1", (x1 - x0, y1 - y0), 0)
+            ImageDraw.Draw(img).polygon([(x - x0 - 0.5, y - y0 - 0.5) for x, y in zip(xs, ys)], fill=1, outline=1)
+            mask = np.asarray(img, dtype=bool); poly = QPolygonF(pts)
+        if not mask.any(): self.clear_selection(); return
+        self.selection, self.selection_bbox, self._selection_poly = mask, (x0, y0, x1, y1), poly
+        self.selectionChanged.emit(int(np.count_nonzero(mask))); self.overlay_item.update()
+
+    def mark_selection(self, marked: bool, color: Optional[int] = None) -> int:
+        """把选区内（可再限定为颜色 color）的像素全部设为已标记/未标记；只处理选区外接矩形，作为一步历史、一次重绘。"""
+        if self.selection is None or self.model is None: return 0
+        x0, y0, x1, y1 = self.selection_bbox
+        region = self.selection if color is None else self.selection & (self.model.indices[y0:y1, x0:x1] == color)
+        ys, xs = np.nonzero(region & (self.mark_mask[y0:y1, x0:x1] != marked))
+        what = "选区内" + (f"颜色 #{color} 的" if color is not None else "")
+        self._apply_flips((ys + y0).astype(np.int64) * self.output_w + xs + x0, f"{'标记' if marked else '取消标记'}{what}像素")
+        return len(xs)
+
+    def toggle_grid(self, on: bool): self.show_grid = on; self.overlay_item.update() if self.overlay_item else None
+    def fit_to_view(self):
+        if self.output_w: self.fitInView(QRectF(0, 0, self.output_w, self.output_h), Qt.KeepAspectRatio)
+
+    def mousePressEvent(self, e):
+        if not self.output_w: return super().mousePressEvent(e)
+        if e.button() == Qt.MiddleButton: self._start_pan(e.position()); return
+        if e.button() == Qt.LeftButton and self.select_mode and self.model is not None:
+            self._sel_drag = [self.mapToScene(e.position().toPoint())]; self._press_pos = e.position(); return
+        if e.button() == Qt.LeftButton:
+            self._press_pos, self._panning = e.position(), False; self.setCursor(Qt.ArrowCursor); self._pan_timer.start(220)
+        elif e.button() == Qt.RightButton and self.hovered_pixel: self.toggle_mark_at(self.hovered_pixel)
+        super().mousePressEvent(e)
+
+    def mouseMoveEvent(self, e):
+        if self.output_w and not self._panning:
+            new_hover = self._map_to_pixel(e.position())
+            if new_hover != self.hovered_pixel:
+                old_hover, self.hovered_pixel = self.hovered_pixel, new_hover
+                if self.overlay_item:
+                    for p in (old_hover, new_hover):
+                        if p: self.overlay_item.update(self.overlay_item.pixel_rect(p))
+                self.hoverChanged.emit(self._hex_at(new_hover), new_hover[0], new_hover[1]) if new_hover else self.hoverChanged.emit("", -1, -1)
+        if self._sel_drag is not None:
+            p = self.mapToScene(e.position().toPoint())
+            if self.select_mode == "lasso": self._sel_drag.append(p)
+            else: self._sel_drag[1:] = [p]
+            self.overlay_item.update()
+        elif self.output_w and self._panning and self._press_pos:
+            new_pos = e.position(); delta = new_pos - self._press_pos; self._press_pos = new_pos; self._translate(delta)
+        super().mouseMoveEvent(e)
+
+    def mouseReleaseEvent(self, e):
+        if self._sel_drag is not None and e.button() == Qt.LeftButton:
+            pts, press, self._sel_drag, self._press_pos = self._sel_drag, self._press_pos, None, None
+            if (e.position() - press).manhattanLength() < 4 and len(pts) < 4:  # 没拖动就当作普通点击：取消选区并选中像素
+                self.clear_selection(); pos = self._map_to_pixel(e.position())
+                if pos: self.select_pixel(pos)
+            else: self._finish_selection(pts)
+            return
+        is_left_click = e.button() == Qt.LeftButton and not self._panning; self._pan_timer.stop()
+        if self._panning: self.setCursor(Qt.CrossCursor if self.select_mode else Qt.ArrowCursor)
+        self._panning, self._press_pos = False, None
+        if is_left_click:
+            pos = self._map_to_pixel(e.position())
+            if pos: self.select_pixel(pos)
+        super().mouseReleaseEvent(e)
+
+    def wheelEvent(self, e):
+        if self.output_w: self._zoom_at(e.position(), 1.25 if e.angleDelta().y() > 0 else 0.8)
+
+    def _start_pan_by_timer(self):
+        if self._press_pos: self._start_pan(self._press_pos)
+    def _start_pan(self, pos): self._panning, self._press_pos, = True, pos; self.setCursor(Qt.ClosedHandCursor)
+    def _translate(self, view_delta: QPointF):
+        t = self.transform(); sx, sy = t.m11(), t.m22()
+        if sx==0 or sy==0: return
+        self.translate(view_delta.x() / sx, view_delta.y() / sy)
+    def _zoom_at(self, pos, factor): self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse); self.scale(factor, factor)
+    def _map_to_pixel(self, view_pos) -> Optional[Tuple[int, int]]:
+        if not self.output_w: return None
+        scene_pos = self.mapToScene(view_pos.toPoint())
+        x, y = math.floor(scene_pos.x()), math.floor(scene_pos.y())
+        if 0 <= x < self.output_w and 0 <= y < self.output_h: return (x, y)
+        return None
+
+    def toggle_mark_at(self, pos_xy: Tuple[int, int]):
+        x, y = pos_xy
+        self._apply_flips(np.array([y * self.output_w + x]), f"切换标记 ({x}, {y})")
+
+    def select_pixel(self, pos_xy: Tuple[int, int], center: bool = False):
+        old_sel, self.selected_pixel = self.selected_pixel, pos_xy
+        self.colorChanged.emit(self._hex_at(pos_xy), pos_xy[0], pos_xy[1])
+        if self.overlay_item:
+            for p in (old_sel, pos_xy):
+                if p: self.overlay_item.update(self.overlay_item.pixel_rect(p))
+        if center: self.centerOn(pos_xy[0] + 0.5, pos_xy[1] + 0.5)
+
+    def set_focus_color(self, k: Optional[int]):
+        """高亮颜色 k：在原图与覆盖层之间叠一层半透明黑色，盖住其他颜色的像素。"""
+        self.focus_color = k if self.model is not None else None
+        if self.focus_color is None:
+            if self.dim_item: self.dim_item.hide()
+            return
+        dim = (self.model.buffer != k).astype(np.uint8)
+        qimg = QImage(dim.data, self.model.width, self.model.height, self.model.stride, QImage.Format_Indexed8)
+        qimg.setColorTable([0x00000000, 0xB4000000])
+        pm = QPixmap.fromImage(qimg)
+        if self.dim_item is None: self.dim_item = self.scene.addPixmap(pm); self.dim_item.setZValue(0.5)
+        else: self.dim_item.setPixmap(pm); self.dim_item.show()
+
+    def next_unmarked_of(self, k: int, origin: Optional[Tuple[int, int]] = None) -> Optional[Tuple[int, int]]:
+        """
+        离 origin（默认当前选中像素，否则视口中心）最近的、颜色为 k 且未标记的像素。
+        连续调用时跳过本轮已经到过的像素（含起点），不会在两个最近的像素之间来回跳；
+        换颜色、标记有变化或全部到过一遍后重新开始一轮。
+        """
+        if self.model is None: return None
+        xs, ys = self.model.coords_of(k)
+        keep = ~self.mark_mask[ys, xs]; xs, ys = xs[keep], ys[keep]
+        if len(xs) == 0: return None
+        if origin is None: origin = self.selected_pixel
+        if origin is None: c = self.mapToScene(self.viewport().rect().center()); origin = (int(c.x()), int(c.y()))
+        if self._visit_color != k: self._visit_color = k; self._visited.clear()
+        if 0 <= origin[0] < self.model.width and 0 <= origin[1] < self.model.height: self._visited.add(origin[1] * self.model.width + origin[0])
+        fresh = ~np.isin(ys.astype(np.int64) * self.model.width + xs, np.fromiter(self._visited, dtype=np.int64, count=len(self._visited)))
+        if not fresh.any():  # 本轮都到过了，从起点以外的像素重新开始
+            self._visited = {origin[1] * self.model.width + origin[0]}
+            fresh = (xs != origin[0]) | (ys != origin[1])
+            if not fresh.any(): return int(xs[0]), int(ys[0])
+        xs, ys = xs[fresh], ys[fresh]
+        i = int(((xs - origin[0]) ** 2 + (ys - origin[1]) ** 2).argmin())
+        self._visited.add(int(ys[i]) * self.model.width + int(xs[i]))
+        return int(xs[i]), int(ys[i])
+        
+    def _hex_at(self, pos_xy: Tuple[int, int]) -> str:
+        if self.model is not None: return self.model.hex_at(*pos_xy)
+        if self.canvas is not None: return self.canvas.hex_at(*pos_xy)
+        return hex_from_qcolor(QColor(self.pixel_qimg.pixel(pos_xy[0], pos_xy[1])))
+
+# -------------------- 颜色进度面板 --------------------
+
+class ColorQueuePanel(QWidget):
+    """按颜色分组的绘制进度：列出每种颜色的总数与未标记数，选中后高亮该颜色并可跳到最近的未标记像素。"""
+    def __init__(self, view: PixelView, parent=None):
+        super().__init__(parent)
+        self.view = view; self._items: Dict[int, QListWidgetItem] = {}
+        lay = QVBoxLayout(self); lay.setContentsMargins(4, 4, 4, 4)
+        self.list = QListWidget(); self.list.currentItemChanged.connect(self._on_current_changed); lay.addWidget(self.list)
+        row = QHBoxLayout(); lay.addLayout(row)
+        self.btn_next = QPushButton("下一个未标记 (N)"); self.btn_next.clicked.connect(self.jump_to_next); row.addWidget(self.btn_next)
+        btn_clear = QPushButton("取消高亮"); btn_clear.clicked.connect(lambda: self.list.setCurrentRow(-1)); row.addWidget(btn_clear)
+        self.lbl_hint = QLabel(""); lay.addWidget(self.lbl_hint)
+        view.markCountsChanged.connect(self.refresh)
+
+    def _text(self, k: int) -> str:
+        total = int(self.view.model.color_counts()[k]); left = total - int(self.view.marked_counts[k])
+        return f"#{k:<2} {self.view.model.hex_at_index(k)}   未标记 {left} / {total}"
+
+    def refresh(self, k: int = -1):
+        model = self.view.model
+        if k >= 0 and k in self._items: self._items[k].setText(self._text(k)); return
+        current = self.view.focus_color
+        self.list.blockSignals(True); self.list.clear(); self._items.clear()
+        if model is not None:
+            for k in np.flatnonzero(model.color_counts()).tolist():
+                icon = QPixmap(14, 14); icon.fill(QColor(*model.palette[k]))
+                item = QListWidgetItem(QIcon(icon), self._text(k)); item.setData(Qt.UserRole, k)
+                self.list.addItem(item); self._items[k] = item
+        if current in self._items: self.list.setCurrentItem(self._items[current])
+        self.list.blockSignals(False)
+
+    def _on_current_changed(self, item, _previous):
+        self.view.set_focus_color(item.data(Qt.UserRole) if item else None); self.lbl_hint.setText("")
+
+    def jump_to_next(self):
+        k = self.view.focus_color
+        if k is None: self.lbl_hint.setText("请先在列表中选择一种颜色"); return
+        pos = self.view.next_unmarked_of(k)
+        if pos is None: self.lbl_hint.setText(f"颜色 #{k} 已全部标记"); return
+        self.view.select_pixel(pos, center=True); self.lbl_hint.setText(f"跳到 ({pos[0]}, {pos[1]})")
+
+# -------------------- 画布截图比对 --------------------
+
+class SnapshotDialog(QDialog):
+    """选择画布截图并设置对齐偏移、颜色容差。"""
+    def __init__(self, parent=None, path: str = "", offset: Tuple[int, int] = (0, 0), tolerance: int = 0, unmark: bool = False):
+        super().__init__(parent)
+        self.setWindowTitle("从画布截图自动标记")
+        form = QFormLayout(self)
+        row = QHBoxLayout(); self.edt_path = QLineEdit(path); row.addWidget(self.edt_path)
+        btn = QPushButton("浏览..."); btn.clicked.connect(self._browse); row.addWidget(btn); form.addRow("截图文件:", row)
+        self.spn_x, self.spn_y = QSpinBox(), QSpinBox()
+        for spn, v in ((self.spn_x, offset[0]), (self.spn_y, offset[1])): spn.setRange(-100000, 100000); spn.setValue(v)
+        form.addRow("目标左上角在截图中的 X:", self.spn_x); form.addRow("目标左上角在截图中的 Y:", self.spn_y)
+        self.spn_tol = QSpinBox(); self.spn_tol.setRange(0, 128); self.spn_tol.setValue(tolerance)
+        self.spn_tol.setToolTip("0 表示颜色必须与调色板完全一致；截图经过压缩或色彩管理时可适当调大"); form.addRow("每通道容差:", self.spn_tol)
+        self.chk_unmark = QCheckBox("取消画布上颜色不符的已标记像素"); self.chk_unmark.setChecked(unmark); form.addRow(self.chk_unmark)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel); buttons.accepted.connect(self.accept); buttons.rejected.connect(self.reject); form.addRow(buttons)
+
+    def _browse(self):
+        path, _ = QFileDialog.getOpenFileName(self, "选择画布截图", self.edt_path.text(), "Images (*.png *.webp *.bmp)")
+        if path: self.edt_path.setText(path)
+
+    def values(self) -> Tuple[str, Tuple[int, int], int, bool]:
+        return self.edt_path.text().strip(), (self.spn_x.value(), self.spn_y.value()), self.spn_tol.value(), self.chk_unmark.isChecked()
+
+# -------------------- 主窗口 --------------------
+
+class MainWindow(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("wplace 像素创作小助手"); self.resize(1100, 700)
+        self.view = PixelView(); self.setCentralWidget(self.view)
+        self._build_toolbar(); self._build_statusbar(); self._build_color_panel(); self._build_profile_action(); self._build_mark_menu()
+        self.src_img: Optional[Image.Image] = None; self.src_img_aspect_ratio = 1.0
+        self._source_path: Optional[str] = None  # 原图路径；加载的项目找不到原图时也保留，保存时原样写回
+        self.palette: List[Tuple[int, int, int]] = WPLACE_PALETTE.copy()
+        self._palette_index = 0; self._auto_palette: Optional[Tuple[int, bool]] = None  # (N, 是否限定 wplace 子集)
+        self.current_project_path = None; self._journal: Optional["project_format.MarkJournal"] = None
+        self._pool = QThreadPool.globalInstance(); self._job: Optional[PixelateJob] = None; self._job_id = 0
+        self._after_pixelate: Optional[Callable[[], None]] = None
+        self._snapshot_args: Tuple[str, Tuple[int, int], int, bool] = ("", (0, 0), 0, False)  # 上次比对用的参数
+        self._preview_timer = QTimer(self); self._preview_timer.setSingleShot(True); self._preview_timer.setInterval(350); self._preview_timer.timeout.connect(self.apply_pixelate)
+        for sig in (self.spn_w.valueChanged, self.spn_h.valueChanged, self.cmb_alg.currentIndexChanged, self.spn_strength.valueChanged, self.cmb_pipeline.currentIndexChanged, self.cmb_down.currentIndexChanged, self.cmb_metric.currentIndexChanged, self.cmb_palette.currentIndexChanged):
+            sig.connect(self._on_params_changed)
+        self.view.colorChanged.connect(self._on_color_changed)
+        self.view.hoverChanged.connect(self._on_hover_changed)
+        self.view.marksToggled.connect(self._on_marks_toggled)
+
+    def _build_toolbar(self):
+        tb = QToolBar("工具"); tb.setMovable(False); self.addToolBar(tb)
+        file_menu = self.menuBar().addMenu("文件")
+        action_open_image = QAction("打开新图片...", self); action_open_image.triggered.connect(self.open_image); file_menu.addAction(action_open_image)
+        file_menu.addSeparator()
+        action_load_project = QAction("加载项目...", self); action_load_project.triggered.connect(self.load_project); file_menu.addAction(action_load_project)
+        self.action_save_project = QAction("保存项目", self); self.action_save_project.triggered.connect(self.save_project); self.action_save_project.setEnabled(False); file_menu.addAction(self.action_save_project)
+        self.action_save_project_as = QAction("项目另存为...", self); self.action_save_project_as.triggered.connect(self.save_project_as); self.action_save_project_as.setEnabled(False); file_menu.addAction(self.action_save_project_as)
+        file_menu.addSeparator()
+        self.action_export_image = QAction("导出图片...", self); self.action_export_image.triggered.connect(self.export_image); self.action_export_image.setEnabled(False); file_menu.addAction(self.action_export_image)
+
+        tb.addAction(action_open_image); tb.addAction(self.action_export_image); tb.addSeparator()
+        tb.addWidget(QLabel("输出宽 W:")); self.spn_w = QSpinBox(); self.spn_w.setRange(1, MAX_CANVAS_SIDE); self.spn_w.setToolTip(f"超过 {LARGE_CANVAS_SIDE} 时生成按瓦片存储的大画布项目 (.wpt)"); self.spn_w.setValue(64); self.spn_w.valueChanged.connect(self._on_width_changed); tb.addWidget(self.spn_w)
+        tb.addWidget(QLabel("高 H:")); self.spn_h = QSpinBox(); self.spn_h.setRange(1, MAX_CANVAS_SIDE); self.spn_h.setValue(64); self.spn_h.setReadOnly(True); tb.addWidget(self.spn_h)
+        self.chk_aspect = QCheckBox("锁定宽高比"); self.chk_aspect.setChecked(True); self.chk_aspect.stateChanged.connect(self._on_aspect_lock_changed); tb.addWidget(self.chk_aspect)
+        btn_apply = QAction("应用像素化", self); btn_apply.triggered.connect(self.apply_pixelate); tb.addAction(btn_apply)
+        self.chk_live = QCheckBox("实时预览"); self.chk_live.setToolTip("参数变化后自动重新像素化"); self.chk_live.stateChanged.connect(self._on_params_changed); tb.addWidget(self.chk_live); tb.addSeparator()
+        tb.addWidget(QLabel("算法:")); self.cmb_alg = QComboBox(); self.cmb_alg.addItems(ALGORITHMS); tb.addWidget(self.cmb_alg)
+        self.spn_strength = QSpinBox(); self.spn_strength.setRange(0, 100); self.spn_strength.setValue(100); self.spn_strength.setSuffix("%"); self.spn_strength.setToolTip("抖动强度：误差扩散的比例或有序抖动的阈值幅度"); self.spn_strength.setEnabled(False); tb.addWidget(self.spn_strength)
+        self.cmb_alg.currentTextChanged.connect(self._update_param_enabled)
+        tb.addWidget(QLabel("流程:")); self.cmb_pipeline = QComboBox(); self.cmb_pipeline.addItems([PIPELINE_DOWNSCALE_FIRST, PIPELINE_LEGACY]); self.cmb_pipeline.currentTextChanged.connect(self._update_param_enabled); tb.addWidget(self.cmb_pipeline)
+        tb.addWidget(QLabel("缩放:")); self.cmb_down = QComboBox(); self.cmb_down.addItems(DOWNSAMPLERS); tb.addWidget(self.cmb_down)
+        tb.addWidget(QLabel("色差:")); self.cmb_metric = QComboBox(); self.cmb_metric.addItems(COLOR_SPACES); self.cmb_metric.setToolTip("最近色度量（旧版流程下的邻近采样与 Floyd-Steinberg 抖动沿用 PIL，固定为 RGB）"); tb.addWidget(self.cmb_metric)
+        tb.addWidget(QLabel("调色板:")); self.cmb_palette = QComboBox(); self.cmb_palette.addItems(PALETTE_PRESETS + [CUSTOM_PALETTE, AUTO_PALETTE, AUTO_WPLACE_PALETTE]); self.cmb_palette.currentIndexChanged.connect(self.on_palette_changed); tb.addWidget(self.cmb_palette)
+        self.chk_grid = QCheckBox("网格"); self.chk_grid.stateChanged.connect(lambda s: self.view.toggle_grid(s == Qt.Checked)); tb.addWidget(self.chk_grid)
+        btn_fit = QAction("适配窗口", self); btn_fit.triggered.connect(self.view.fit_to_view); tb.addAction(btn_fit)
+        tb.addSeparator()
+        tb.addWidget(QLabel("  界面不透明度:"))
+        self.opacity_slider = QSlider(Qt.Horizontal)
+        self.opacity_slider.setFixedWidth(120) # 给滑块一个固定宽度
+        self.opacity_slider.setRange(30, 100)  # 不透明度范围从 30% 到 100%
+        self.opacity_slider.setValue(100)      # 默认是 100% 不透明
+        
+        # 连接滑块的 valueChanged 信号到我们的新方法
+        self.opacity_slider.valueChanged.connect(self.set_window_opacity)
+        
+        # 将滑块添加到工具栏
+        tb.addWidget(self.opacity_slider)       
+    def set_window_opacity(self, value):
+        """
+        根据滑块的值（这是一个整数，例如 30 到 100）来设置窗口的不透明度。
+        """
+        # 将整数值转换为 0.0 到 1.0 之间的小数
+        opacity_level = value / 100.0
+        
+        # 调用 QMainWindow 自带的 setWindowOpacity 方法
+        self.setWindowOpacity(opacity_level)
+    def _build_color_panel(self):
+        self.color_panel = ColorQueuePanel(self.view)
+        dock = QDockWidget("颜色进度", self); dock.setObjectName("color_queue"); dock.setWidget(self.color_panel); self.addDockWidget(Qt.RightDockWidgetArea, dock)
+        self.menu_view = self.menuBar().addMenu("视图"); self.menu_view.addAction(dock.toggleViewAction())
+        action_next = QAction("下一个未标记像素", self); action_next.setShortcut("N"); action_next.triggered.connect(self.color_panel.jump_to_next); self.addAction(action_next)
+
+    def _build_profile_action(self):
+        self.action_profile = QAction("性能分析", self); self.action_profile.setCheckable(True); self.action_profile.setToolTip("在状态栏显示载入图片和像素化各阶段的耗时")
+        self.action_profile.toggled.connect(self._on_profile_toggled); self.menu_view.addSeparator(); self.menu_view.addAction(self.action_profile)
+        self._last_profile = ""
+
+    def _build_mark_menu(self):
+        menu = self.menuBar().addMenu("标记")
+        self.action_undo = QAction("撤销", self); self.action_undo.setShortcuts(QKeySequence.Undo); self.action_undo.triggered.connect(lambda: self._step_history(redo=False)); menu.addAction(self.action_undo)
+        self.action_redo = QAction("重做", self); self.action_redo.setShortcuts([QKeySequence("Ctrl+Y"), QKeySequence("Ctrl+Shift+Z")]); self.action_redo.triggered.connect(lambda: self._step_history(redo=True)); menu.addAction(self.action_redo)
+        menu.addSeparator()
+        group = QActionGroup(self); group.setExclusionPolicy(QActionGroup.ExclusionPolicy.ExclusiveOptional)
+        self.action_rect_select = QAction("矩形选择", self); self.action_rect_select.setShortcut("R")
+        self.action_lasso_select = QAction("套索选择", self); self.action_lasso_select.setShortcut("L")
+        for a in (self.action_rect_select, self.action_lasso_select):
+            a.setCheckable(True); a.setEnabled(False); a.toggled.connect(self._on_select_mode_toggled); group.addAction(a); menu.addAction(a)
+        self.action_mark_sel = QAction("标记选区内全部像素", self); self.action_mark_sel.setShortcut("M"); self.action_mark_sel.triggered.connect(lambda: self._mark_selection(True))
+        self.action_unmark_sel = QAction("取消选区内全部标记", self); self.action_unmark_sel.setShortcut("Shift+M"); self.action_unmark_sel.triggered.connect(lambda: self._mark_selection(False))
+        self.action_mark_sel_color = QAction("标记选区内当前颜色的像素", self); self.action_mark_sel_color.setShortcut("C"); self.action_mark_sel_color.setToolTip("当前颜色：颜色进度中选中的颜色，否则为左键选中像素的颜色"); self.action_mark_sel_color.triggered.connect(lambda: self._mark_selection(True, by_color=True))
+        self.action_clear_sel = QAction("取消选择", self); self.action_clear_sel.setShortcut("Esc"); self.action_clear_sel.triggered.connect(self.view.clear_selection)
+        for a in (self.action_mark_sel, self.action_unmark_sel, self.action_mark_sel_color, self.action_clear_sel): menu.addAction(a)
+        menu.addSeparator()
+        self.action_auto_mark = QAction("从画布截图自动标记...", self); self.action_auto_mark.triggered.connect(self.auto_mark_from_snapshot); self.action_auto_mark.setEnabled(False); menu.addAction(self.action_auto_mark)
+        self.view.historyChanged.connect(self._update_history_actions); self.view.selectionChanged.connect(self._on_selection_changed)
+        self._update_history_actions(); self._on_selection_changed(0)
+
+    def _build_statusbar(self):
+        sb = QStatusBar(); self.setStatusBar(sb)
+        self.lbl_info = QLabel("未载入图片"); sb.addWidget(self.lbl_info)
+        self.progress_bar = QProgressBar(); self.progress_bar.setRange(0, len(PIXELATE_STAGES)); self.progress_bar.setFixedWidth(140); self.progress_bar.setTextVisible(False); self.progress_bar.hide(); sb.addPermanentWidget(self.progress_bar)
+        self.lbl_profile = QLabel(""); self.lbl_profile.hide(); sb.addPermanentWidget(self.lbl_profile)
+        self.lbl_hover_info = QLabel(""); sb.addPermanentWidget(self.lbl_hover_info)
+
+    def _update_ui_state(self, has_pixel_data: bool):
+        self.action_save_project.setEnabled(has_pixel_data)
+        self.action_save_project_as.setEnabled(has_pixel_data)
+        self.action_export_image.setEnabled(has_pixel_data)
+        self.action_auto_mark.setEnabled(has_pixel_data and self.view.model is not None)
+        for a in (self.action_rect_select, self.action_lasso_select):
+            a.setEnabled(has_pixel_data and self.view.model is not None)
+            if not a.isEnabled(): a.setChecked(False)
+
+    def _on_profile_toggled(self, on: bool):
+        self.lbl_profile.setVisible(on); self.lbl_profile.setText(self._last_profile or "性能分析：下次载入或像素化时显示各阶段耗时")
+
+    def _show_profile(self, what: str, timer: StageTimer):
+        self._last_profile = f"{what}：{timer.summary()}"
+        if self.action_profile.isChecked(): self.lbl_profile.setText(self._last_profile)
+
+    def _on_color_changed(self, hex_str: str, x: int, y: int): self.lbl_info.setText(f"已选中: ({x}, {y}) | 颜色: {hex_str.upper()}")
+    def _on_hover_changed(self, hex_str: str, x: int, y: int): self.lbl_hover_info.setText(f"悬停: ({x}, {y}) {hex_str.upper()}" if x >= 0 else "")
+    def _on_width_changed(self, new_width: int):
+        if self.chk_aspect.isChecked() and self.src_img:
+            new_height = int(new_width / self.src_img_aspect_ratio)
+            self.spn_h.blockSignals(True); self.spn_h.setValue(max(1, new_height)); self.spn_h.blockSignals(False)
+    def _on_aspect_lock_changed(self, state):
+        is_locked = (state == Qt.Checked)
+        self.spn_h.setReadOnly(is_locked)
+        if is_locked: self._on_width_changed(self.spn_w.value())
+
+    def open_image(self):
+        path, _ = QFileDialog.getOpenFileName(self, "选择图片", "", "Images (*.png *.jpg *.jpeg *.bmp *.webp)")
+        if not path: return
+        try: self.src_img = Image.open(path)
+        except Exception as e: QMessageBox.critical(self, "错误", f"无法打开图片：{e}"); return
+        self.src_img.filename = path # 保存文件路径
+        self._source_path = path
+        w, h = self.src_img.size
+        if h > 0: self.src_img_aspect_ratio = w / h
+        self._on_width_changed(self.spn_w.value())
+        timer = StageTimer()
+        with timer.measure("解码"): self.src_img.load()
+        with timer.measure("转为 QImage"): qimg = qimage_from_pil(self.src_img)
+        with timer.measure("上屏"): self.view.set_image(qimg)
+        self._show_profile("载入", timer)
+        self.lbl_info.setText("已载入图片，请设置参数并点击“应用像素化”")
+        self.current_project_path = None; self._close_journal(); self._update_ui_state(False)
+        if self.cmb_palette.currentText() in (AUTO_PALETTE, AUTO_WPLACE_PALETTE) and self._auto_palette: self._extract_auto_palette(*self._auto_palette)
+        self._on_params_changed()
+
+    def on_palette_changed(self, idx: int):
+        name = self.cmb_palette.itemText(idx)
+        if name in PALETTE_PRESETS: self.palette = preset_palette(name); ok = True
+        elif name == CUSTOM_PALETTE: ok = self._ask_custom_palette()
+        else: ok = self._ask_auto_palette(subset=(name == AUTO_WPLACE_PALETTE))
+        if ok: self._palette_index = idx
+        else:
+            self.cmb_palette.blockSignals(True); self.cmb_palette.setCurrentIndex(self._palette_index); self.cmb_palette.blockSignals(False)
+
+    def _ask_auto_palette(self, subset: bool) -> bool:
+        if not self.src_img: QMessageBox.information(self, "提示", "请先打开一张图片"); return False
+        limit = len(WPLACE_PALETTE) if subset else 256
+        last = self._auto_palette[0] if self._auto_palette else 16
+        n, ok = QInputDialog.getInt(self, "自动调色板", f"颜色数量 (2-{limit})：", min(last, limit), 2, limit)
+        if not ok: return False
+        return self._extract_auto_palette(n, subset)
+
+    def _extract_auto_palette(self, n: int, subset: bool) -> bool:
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            t = time.perf_counter()
+            self.palette = adaptive_palette.extract_palette(self.src_img, n, WPLACE_PALETTE if subset else None)
+            self._auto_palette = (n, subset)
+            self.lbl_info.setText(f"已从图片提取 {len(self.palette)} 色调色板（{(time.perf_counter() - t) * 1000:.0f} ms）")
+            return True
+        except Exception as e: QMessageBox.critical(self, "错误", f"提取调色板失败：{e}"); return False
+        finally: QApplication.restoreOverrideCursor()
+
+    def _ask_custom_palette(self) -> bool:
+        text, ok = QInputDialog.getText(self, "自定义调色板", "请输入十六进制颜色 (#RRGGBB)，用逗号/空格分隔：")
+        if not ok or not text.strip(): return False
+        cols = parse_hex_palette(text)
+        if not cols: QMessageBox.warning(self, "提示", "未解析到有效颜色。"); return False
+        self.palette = cols
+        return True
+
+    def _on_params_changed(self, *_):
+        # 参数一变，正在跑的任务就过期了；实时预览模式下防抖后自动重跑
+        self._cancel_pixelate()
+        if self.chk_live.isChecked() and self.src_img and not self._is_large_output(): self._preview_timer.start()
+
+    def _is_large_output(self) -> bool: return max(self.spn_w.value(), self.spn_h.value()) > LARGE_CANVAS_SIDE
+
+    def _cancel_pixelate(self):
+        if self._job: self._job.cancel(); self._job = None; self._set_after_pixelate(None)
+        self._job_id += 1  # 旧任务已排队的 progress/finished/failed 信号都会因 id 不符被丢弃
+        self.progress_bar.hide()
+
+    def apply_pixelate(self):
+        if not self.src_img: QMessageBox.information(self, "提示", "请先打开一张图片"); return
+        self._preview_timer.stop()
+        after = self._after_pixelate; self._cancel_pixelate(); self._set_after_pixelate(after)
+        W, H, alg, pal = self.spn_w.value(), self.spn_h.value(), self.cmb_alg.currentText(), list(self.palette)
+        if self._is_large_output(): self._build_large_canvas(W, H); return
+        self._job_id += 1
+        job = PixelateJob(self._job_id, self.src_img, W, H, alg, pal, self.cmb_pipeline.currentText(), self.cmb_down.currentText(), self.cmb_metric.currentText(), self.spn_strength.value() / 100)
+        job.signals.progress.connect(self._on_pixelate_progress); job.signals.finished.connect(self._on_pixelate_finished); job.signals.failed.connect(self._on_pixelate_failed)
+        self._job = job; self.progress_bar.setRange(0, len(PIXELATE_STAGES)); self.progress_bar.setValue(0); self.progress_bar.show()
+        self._pool.start(job)
+
+    def _build_large_canvas(self, W: int, H: int):
+        path, _ = QFileDialog.getSaveFileName(self, f"{W}×{H} 超过 {LARGE_CANVAS_SIDE}，将生成大画布项目", "", "wplace Tiled Canvas (*.wpt)")
+        if not path: return
+        if self.view.canvas is not None and Path(self.view.canvas.path).resolve() == Path(path).resolve():
+            QMessageBox.warning(self, "提示", "不能覆盖当前打开的大画布，请换一个文件名。"); return
+        text, ok = QInputDialog.getText(self, "画布位置", "作品左上角在 wplace 画布上的像素坐标 (x, y)，用于对齐 1000×1000 瓦片：", text="0, 0")
+        if not ok: return
+        try:
+            origin = tuple(int(v) for v in text.replace(",", " ").split())
+            if len(origin) != 2 or min(origin) < 0: raise ValueError
+        except ValueError: QMessageBox.warning(self, "提示", "坐标格式应为 “x, y”，且不能为负。"); return
+        self._job_id += 1
+        job = CanvasBuildJob(self._job_id, path, self.src_img, W, H, origin, self.cmb_alg.currentText(), list(self.palette),
+                             self.cmb_metric.currentText(), self.spn_strength.value() / 100, self._current_settings())
+        job.signals.tiles.connect(self._on_canvas_progress); job.signals.finished.connect(self._on_canvas_finished); job.signals.failed.connect(self._on_pixelate_failed)
+        self._job = job; self.progress_bar.setValue(0); self.progress_bar.show()
+        self._pool.start(job)
+
+    def _on_canvas_progress(self, job_id: int, done: int, total: int):
+        if job_id != self._job_id: return
+        self.progress_bar.setRange(0, total); self.progress_bar.setValue(done); self.lbl_info.setText(f"生成大画布… 瓦片 {done}/{total}")
+
+    def _on_canvas_finished(self, job_id: int, canvas: "tiled_canvas.TiledCanvas"):
+        if job_id != self._job_id: canvas.close(); return  # 过期的结果不打开，但要释放映射
+        self._job = None; self._set_after_pixelate(None); self.progress_bar.hide()
+        self._open_canvas(canvas)
+
+    def _open_canvas(self, canvas: "tiled_canvas.TiledCanvas"):
+        self._close_journal()  # 大画布的标记直接写入 .wpt，不需要日志
+        self.view.set_canvas(canvas); self.palette = list(canvas.palette)
+        self.current_project_path = canvas.path; self._update_ui_state(True)
+        self.lbl_info.setText(f"大画布 {canvas.width}×{canvas.height}，共 {canvas.tiles_x}×{canvas.tiles_y} 个瓦片（画布瓦片 {canvas.grid_x}, {canvas.grid_y} 起）；"
+                              f"按视口加载，标记直接写入 {Path(canvas.path).name}")
+
+    def _on_pixelate_progress(self, job_id: int, stage: str):
+        if job_id != self._job_id: return
+        self.progress_bar.setValue(PIXELATE_STAGES.index(stage)); self.lbl_info.setText(f"像素化中… {stage}")
+
+    def _on_pixelate_finished(self, job_id: int, result: Tuple[IndexedImage, StageTimer]):
+        if job_id != self._job_id: return
+        model, timer = result; self._job = None; self.progress_bar.hide()
+        self._close_journal()  # 新结果与已保存的项目不再对应，日志停在上次保存的状态
+        if _is_canvas_path(self.current_project_path): self.current_project_path = None  # 已离开大画布，不能再往 .wpt 里存普通项目
+        with timer.measure("转为 QImage"): qimg = qimage_from_indexed(model)
+        with timer.measure("上屏"): self.view.set_image(qimg, model)
+        self._show_profile("像素化", timer)
+        used = int(np.count_nonzero(model.color_counts()))
+        self.lbl_info.setText(f"像素化完成（{model.width}×{model.height}，用到 {used} 种颜色）：左键选择，右键标记；滚轮缩放，长按/中键拖动。")
+        self._update_ui_state(True)
+        after = self._after_pixelate; self._set_after_pixelate(None)
+        if after: after()
+
+    def _on_pixelate_failed(self, job_id: int, msg: str):
+        if job_id != self._job_id: return
+        pending = self._after_pixelate is not None; self._job = None; self._set_after_pixelate(None); self.progress_bar.hide()
+        QMessageBox.critical(self, "错误", f"像素化失败：{msg}" + ("\n项目的标记没有恢复，原项目文件未改动。" if pending else ""))
+
+    def save_project(self):
+        if self.view.canvas is not None:
+            self.view.canvas.save_meta(self._current_settings()); self.lbl_info.setText(f"大画布已保存: {Path(self.view.canvas.path).name}"); return
+        if self.current_project_path: self._perform_save(self.current_project_path)
+        else: self.save_project_as()
+
+    def save_project_as(self):
+        if self.view.canvas is not None: self._save_canvas_as(); return
+        if self.view.model is None: return
+        path, _ = QFileDialog.getSaveFileName(self, "项目另存为", "", "wplace Project (*.wpp)")
+        if path: self._perform_save(path)
+
+    def _save_canvas_as(self):
+        canvas = self.view.canvas
+        path, _ = QFileDialog.getSaveFileName(self, "大画布另存为", "", "wplace Tiled Canvas (*.wpt)")
+        if not path or Path(path).resolve() == Path(canvas.path).resolve(): return
+        try:
+            canvas.save_meta(self._current_settings()); shutil.copyfile(canvas.path, path)
+            self._open_canvas(tiled_canvas.TiledCanvas.open(path))
+        except Exception as e: QMessageBox.critical(self, "错误", f"保存大画布失败: {e}")
+            
+    def _current_settings(self) -> Dict:
+        return {"width": self.spn_w.value(), "height": self.spn_h.value(), "algorithm": self.cmb_alg.currentText(), "dither_strength": self.spn_strength.value() / 100, "pipeline": self.cmb_pipeline.currentText(), "downsampler": self.cmb_down.currentText(), "color_metric": self.cmb_metric.currentText(), "palette_name": self.cmb_palette.currentText(), "custom_palette": self.palette if self.cmb_palette.currentText() not in PALETTE_PRESETS else None}
+
+    def _apply_settings(self, settings: Dict):
+        """把项目里的参数写回控件；期间屏蔽信号，免得触发取消任务、实时预览或自定义调色板对话框。"""
+        widgets = (self.spn_w, self.spn_h, self.cmb_alg, self.spn_strength, self.cmb_pipeline, self.cmb_down, self.cmb_metric, self.cmb_palette)
+        for wdg in widgets: wdg.blockSignals(True)
+        try:
+            self.spn_w.setValue(settings["width"]); self.spn_h.setValue(settings["height"])
+            self.cmb_alg.setCurrentText(settings["algorithm"]); self.spn_strength.setValue(round(settings.get("dither_strength", 1.0) * 100))
+            # 旧项目没有记录流程，它们的标记基于旧流程的结果
+            self.cmb_pipeline.setCurrentText(settings.get("pipeline", PIPELINE_LEGACY)); self.cmb_down.setCurrentText(settings.get("downsampler", DOWNSAMPLERS[0]))
+            self.cmb_metric.setCurrentText(settings.get("color_metric", "RGB"))
+            palette_name = settings["palette_name"]; idx = self.cmb_palette.findText(palette_name)
+            if idx != -1: self.cmb_palette.setCurrentIndex(idx); self._palette_index = idx
+            # 自定义和自动提取的调色板都随项目保存，加载时直接使用，不再重新提取
+            if palette_name not in PALETTE_PRESETS: self.palette = [tuple(c) for c in settings["custom_palette"]]
+            elif idx != -1: self.on_palette_changed(idx)
+            if palette_name in (AUTO_PALETTE, AUTO_WPLACE_PALETTE): self._auto_palette = (len(self.palette), palette_name == AUTO_WPLACE_PALETTE)
+        finally:
+            for wdg in widgets: wdg.blockSignals(False)
+        self._update_param_enabled()
+
+    def _update_param_enabled(self, *_):
+        # v1 项目等待重新像素化后恢复标记期间锁定参数，否则结果与标记对不上
+        locked = self._after_pixelate is not None
+        for wdg in (self.spn_w, self.chk_aspect, self.chk_live, self.cmb_alg, self.spn_strength, self.cmb_pipeline, self.cmb_down, self.cmb_metric, self.cmb_palette): wdg.setEnabled(not locked)
+        if locked: return
+        alg, legacy = self.cmb_alg.currentText(), self.cmb_pipeline.currentText() == PIPELINE_LEGACY
+        pil_only = legacy and alg in LEGACY_PIL_ALGORITHMS  # 这两种在旧版流程里走 PIL，度量和强度都不起作用
+        self.cmb_down.setEnabled(not legacy); self.cmb_metric.setEnabled(not pil_only); self.spn_strength.setEnabled(alg in DITHER_ALGORITHMS and not pil_only)
+
+    def _set_after_pixelate(self, fn: Optional[Callable[[], None]]):
+        self._after_pixelate = fn; self._update_param_enabled()
+
+    def closeEvent(self, event):
+        # 大画布的映射必须释放，否则 Windows 上 .wpt 文件在进程退出前一直被占用
+        self._cancel_pixelate(); self._close_journal(); self.view.drop_canvas()
+        super().closeEvent(event)
+
+    def _close_journal(self):
+        if self._journal: self._journal.close(); self._journal = None
+
+    def _on_marks_toggled(self, positions):
+        if self._journal: self._journal.append(positions)
+
+    def _perform_save(self, path: str):
+        if self.view.model is None: QMessageBox.warning(self, "提示", "没有可保存的数据。"); return
+        if _is_canvas_path(path): QMessageBox.warning(self, "提示", "普通项目不能保存为 .wpt 大画布文件，请换用 .wpp。"); return
+        project = project_format.Project(self._current_settings(), self._source_path, self.view.model, self.view.mark_mask)
+        try: journal_id = project_format.save_project(path, project)
+        except Exception as e: QMessageBox.critical(self, "错误", f"保存项目失败: {e}"); return  # 原来的日志仍对应磁盘上的项目，继续记录
+        self._close_journal()
+        try: self._journal = project_format.MarkJournal.start(path, journal_id)
+        except OSError as e: QMessageBox.warning(self, "提示", f"项目已保存，但无法创建自动保存日志: {e}")
+        self.current_project_path = path; self.lbl_info.setText(f"项目已保存到: {Path(path).name}")
+
+    def load_project(self):
+        path, _ = QFileDialog.getOpenFileName(self, "加载项目", "", "wplace Project (*.wpp *.wpt)")
+        if not path: return
+        try:
+            if _is_canvas_path(path):
+                canvas = tiled_canvas.TiledCanvas.open(path)
+                self._cancel_pixelate(); self._preview_timer.stop()
+                if canvas.settings: self._apply_settings(canvas.settings)
+                self._open_canvas(canvas); return
+            project = project_format.load_project(path)
+            if project.model is None: self._load_v1_project(path, project); return
+            replayed = project_format.replay_journal(path, project)
+            self._cancel_pixelate(); self._preview_timer.stop(); self._close_journal()
+            src_path = self._source_path = project.source_image_path
+            # v2 自带像素化结果，原图只在还能找到时载入，以便之后调整参数重新像素化
+            self.src_img = Image.open(src_path) if src_path and Path(src_path).exists() else None
+            if self.src_img: self.src_img.filename = src_path
+            self.src_img_aspect_ratio = project.model.width / project.model.height
+            self._apply_settings(project.settings); self.palette = list(project.model.palette)
+            self.view.set_model(project.model); self.view.set_mark_mask(project.mark_mask)
+            self._update_ui_state(True)
+            self.current_project_path = path; self._journal = project_format.MarkJournal.resume(path, project.journal_id)
+            msg = f"项目 '{Path(path).stem}' 已加载。"
+            if replayed: msg += f" 已从自动保存日志恢复 {replayed} 次标记修改。"
+            self.lbl_info.setText(msg)
+        except Exception as e: QMessageBox.critical(self, "错误", f"加载项目失败: {e}")
+
+    def _load_v1_project(self, path: str, project: "project_format.Project"):
+        """v1 项目只记录了参数，需要原图重新像素化后再恢复标记。"""
+        src_path = project.source_image_path
+        if not src_path or not Path(src_path).exists():
+            QMessageBox.warning(self, "提示", f"找不到原始图片:\n{src_path}\n请手动选择。"); self.open_image(); return
+        self.src_img = Image.open(src_path); self.src_img.filename = self._source_path = src_path
+        w, h = self.src_img.size
+        if h > 0: self.src_img_aspect_ratio = w / h
+        self._close_journal(); self._apply_settings(project.settings)
+        self.current_project_path = None  # 标记恢复之前不能保存，免得把空标记写回原项目
+
+        marks = set(project.marked_pixels)
+        def restore():
+            self.view.painted = marks; self.current_project_path = path
+            self.lbl_info.setText(f"项目 '{Path(path).stem}' 已加载（v1 格式，保存时将升级为 v2）。")
+        self._set_after_pixelate(restore)
+        self.apply_pixelate()
+
+    def _update_history_actions(self):
+        h = self.view.history
+        self.action_undo.setEnabled(h.can_undo()); self.action_undo.setText(f"撤销 {h.undo_label()}".strip())
+        self.action_redo.setEnabled(h.can_redo()); self.action_redo.setText(f"重做 {h.redo_label()}".strip())
+
+    def _step_history(self, redo: bool):
+        label = self.view.redo() if redo else self.view.undo()
+        if label is not None: self.lbl_info.setText(f"已{'重做' if redo else '撤销'}：{label}")
+
+    def _on_select_mode_toggled(self, _checked: bool):
+        mode = "rect" if self.action_rect_select.isChecked() else "lasso" if self.action_lasso_select.isChecked() else None
+        self.view.set_select_mode(mode)
+        if mode: self.lbl_info.setText("左键拖动框选区域" if mode == "rect" else "按住左键圈出区域；中键拖动画面")
+
+    def _on_selection_changed(self, count: int):
+        for a in (self.action_mark_sel, self.action_unmark_sel, self.action_mark_sel_color): a.setEnabled(count > 0)
+        self.action_clear_sel.setEnabled(count > 0)
+        if count: self.lbl_info.setText(f"已选择 {count} 个像素：M 标记全部，Shift+M 取消标记，C 只标记当前颜色，Esc 取消选择")
+
+    def _mark_selection(self, marked: bool, by_color: bool = False):
+        view, color = self.view, None
+        if by_color:
+            color = view.focus_color
+            if color is None and view.selected_pixel and view.model is not None: color = view.model.index_at(*view.selected_pixel)
+            if color is None: QMessageBox.information(self, "提示", "请先在“颜色进度”中选择一种颜色，或左键选中一个该颜色的像素"); return
+        n = view.mark_selection(marked, color)
+        self.lbl_info.setText(f"{view.history.undo_label()}：{n} 个像素（Ctrl+Z 撤销）" if n else "选区内没有需要修改的像素")
+
+    def auto_mark_from_snapshot(self):
+        model = self.view.model
+        if model is None: QMessageBox.information(self, "提示", "请先像素化图片或加载项目"); return
+        dlg = SnapshotDialog(self, *self._snapshot_args)
+        if dlg.exec() != QDialog.Accepted: return
+        path, offset, tolerance, unmark = self._snapshot_args = dlg.values()
+        try:
+            t = time.perf_counter()
+            with Image.open(path) as snap: diff = compare_snapshot(model, snap, offset, tolerance)
+            mask = self.view.mark_mask | diff.matched
+            if unmark: mask &= ~diff.mismatched
+            changed = self.view.bulk_set_marks(mask, "从截图自动标记")
+        except Exception as e: QMessageBox.critical(self, "错误", f"比对失败：{e}"); return
+        self.lbl_info.setText(f"截图比对完成（{(time.perf_counter() - t) * 1000:.0f} ms）：一致 {diff.matched_count}，不一致 {diff.mismatched_count}，"
+                              f"未覆盖 {diff.uncovered_count}；标记变化 {changed} 个像素")
+        if diff.mismatched_count:
+            per_color = diff.mismatch_counts(model)
+            worst = [k for k in np.argsort(-per_color)[:8].tolist() if per_color[k]]
+            lines = "\n".join(f"#{k:<2} {model.hex_at_index(k)}  {int(per_color[k])} 个" for k in worst)
+            QMessageBox.information(self, "比对结果", f"有 {diff.mismatched_count} 个像素与画布不一致，按目标颜色统计（前 {len(worst)} 种）：\n{lines}\n\n可在“颜色进度”中选中颜色后按 N 逐个定位未标记的像素。")
+
+    def export_image(self):
+        if self.view.canvas is not None: self._export_canvas_tiles(); return
+        if self.view.pixel_qimg is None: QMessageBox.information(self, "提示", "没有可导出的结果"); return
+        path, _ = QFileDialog.getSaveFileName(self, "导出为图片", "pixelized.png", "PNG (*.png)")
+        if not path: return
+        include_marks = QMessageBox.question(self, "导出选项", "是否在导出图像中包含标记覆盖？", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No)
+        qimg = self.view.pixel_qimg
+        if include_marks == QMessageBox.StandardButton.Yes:
+            img_to_save = qimg.convertToFormat(QImage.Format_ARGB32); p = QPainter(img_to_save)
+            if self.view.overlay_item: self.view.overlay_item.paint(p, None, None)
+            p.end(); img_to_save.save(path)
+        elif self.view.model is not None: self.view.model.to_pil().save(path)  # 索引色 PNG，体积更小
+        else: qimg.save(path)
+        QMessageBox.information(self, "完成", f"已导出到：{path}")
+
+    def _export_canvas_tiles(self):
+        out_dir = QFileDialog.getExistingDirectory(self, "导出瓦片到目录")
+        if not out_dir: return
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try: files = self.view.canvas.export_tiles(out_dir)
+        except Exception as e: QApplication.restoreOverrideCursor(); QMessageBox.critical(self, "错误", f"导出失败：{e}"); return
+        QApplication.restoreOverrideCursor()
+        QMessageBox.information(self, "完成", f"已按画布瓦片坐标导出 {len(files)} 个 1000×1000 PNG 到：{out_dir}")
+
+# -------------------- 入口 --------------------
+
+def main(profile=None):
+    app = QApplication(sys.argv)
+    if profile: profile.mark("创建 QApplication")
+    w = MainWindow()
+    if profile: profile.mark("构造 MainWindow"); w.action_profile.setChecked(True)  # 带 --profile-startup 启动时顺带打开性能分析
+    w.show()
+    if profile: profile.mark("show()"); QTimer.singleShot(0, lambda: (profile.mark("首次进入事件循环"), profile.report()))
+    sys.exit(app.exec())
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
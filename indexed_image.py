@@ -0,0 +1,67 @@
+# indexed_image.py
+"""调色板索引图：像素化结果的核心数据模型（H×W uint8 索引 + 调色板），不依赖 Qt。"""
+from __future__ import annotations
+from typing import List, Tuple, Sequence, Optional
+
+import numpy as np
+from PIL import Image
+
+class IndexedImage:
+    """
+    像素化结果的唯一数据源。索引缓冲区的行宽按 4 字节对齐，
+    GUI 可以直接在其上构造 Format_Indexed8 的 QImage 而不拷贝像素。
+    每种颜色的像素位置在首次查询时一次性建立，之后按颜色查询只是切片。
+    """
+    def __init__(self, indices: np.ndarray, palette: Sequence[Tuple[int, int, int]]):
+        idx = np.asarray(indices, dtype=np.uint8)
+        if idx.ndim != 2: raise ValueError("索引数组必须是二维的 (H×W)")
+        self.palette: List[Tuple[int, int, int]] = [tuple(int(v) for v in c) for c in palette[:256]]
+        if idx.size and int(idx.max()) >= len(self.palette): raise ValueError("索引超出调色板范围")
+        h, w = idx.shape
+        self.buffer = np.zeros((h, (w + 3) & ~3), dtype=np.uint8); self.buffer[:, :w] = idx
+        self.indices = self.buffer[:, :w]
+        self._counts: Optional[np.ndarray] = None
+        self._order: Optional[np.ndarray] = None; self._starts: Optional[np.ndarray] = None
+
+    @property
+    def width(self) -> int: return self.indices.shape[1]
+    @property
+    def height(self) -> int: return self.indices.shape[0]
+    @property
+    def stride(self) -> int: return self.buffer.shape[1]
+
+    # ---- 单像素查询 ----
+    def index_at(self, x: int, y: int) -> int: return int(self.indices[y, x])
+    def hex_at(self, x: int, y: int) -> str: return self.hex_at_index(self.indices[y, x])
+    def hex_at_index(self, k: int) -> str: return "#%02X%02X%02X" % self.palette[k]
+
+    # ---- 统计与按颜色查询 ----
+    def color_counts(self) -> np.ndarray:
+        """每种调色板颜色的像素数，长度等于调色板长度。"""
+        if self._counts is None: self._counts = np.bincount(self.indices.ravel(), minlength=len(self.palette))
+        return self._counts
+
+    def _build_color_index(self):
+        # uint8 的稳定排序走基数排序，一次建好后每种颜色的像素是 _order 中连续的一段
+        self._order = np.argsort(self.indices.ravel(), kind="stable").astype(np.int64)
+        self._starts = np.concatenate([[0], np.cumsum(self.color_counts())])
+
+    def pixels_of(self, k: int) -> np.ndarray:
+        """颜色 k 的全部像素的线性位置 (y * W + x)，按行优先顺序排列。"""
+        if self._order is None: self._build_color_index()
+        return self._order[self._starts[k]:self._starts[k + 1]]
+
+    def coords_of(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """颜色 k 的全部像素坐标 (xs, ys)。"""
+        ys, xs = np.divmod(self.pixels_of(k), self.width)
+        return xs, ys
+
+    # ---- 转换 ----
+    def palette_array(self) -> np.ndarray: return np.asarray(self.palette, dtype=np.uint8).reshape(-1, 3)
+    def to_rgb_array(self) -> np.ndarray: return self.palette_array()[self.indices]
+
+    def to_pil(self) -> Image.Image:
+        """导出为 'P' 模式图片（PNG 保存时即为索引色 PNG）。"""
+        img = Image.fromarray(np.ascontiguousarray(self.indices))
+        img.putpalette([c for rgb in self.palette for c in rgb])
+        return img
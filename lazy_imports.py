@@ -0,0 +1,87 @@
+# lazy_imports.py
+"""
+延迟导入与启动计时。
+lazy_import("sklearn.cluster") 返回一个占位模块，第一次访问它的属性时才真正导入，
+这样 scikit-learn 之类的重量级依赖只在用到对应功能时才付出导入时间。
+StartupProfile 在 --profile-startup 时启用，记录每个模块的导入耗时和各启动阶段耗时。
+display_width / text_cell 供命令行表格按终端显示宽度对齐（batch、benchmark 共用）。
+"""
+from __future__ import annotations
+from typing import List, Tuple, Optional
+
+import sys
+import time
+import types
+import builtins
+import importlib
+
+_active_profile: Optional["StartupProfile"] = None
+
+class LazyModule(types.ModuleType):
+    """模块占位对象：首次访问属性时导入真正的模块，之后的属性访问直接转发。"""
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_target"] = None
+
+    def _load(self) -> types.ModuleType:
+        mod = self.__dict__["_lazy_target"]
+        if mod is None:
+            t = time.perf_counter()
+            mod = self.__dict__["_lazy_target"] = importlib.import_module(self.__name__)
+            if _active_profile: _active_profile.record_lazy(self.__name__, time.perf_counter() - t)
+        return mod
+
+    def __getattr__(self, attr: str): return getattr(self._load(), attr)
+    def __dir__(self): return dir(self._load())
+
+def lazy_import(name: str) -> types.ModuleType:
+    """已经导入过的模块直接返回，否则返回延迟占位模块。"""
+    return sys.modules.get(name) or LazyModule(name)
+
+def display_width(text: str) -> int:
+    """终端显示宽度：中文等宽字符占两列。"""
+    return sum(2 if ord(ch) > 0x2E80 else 1 for ch in text)
+
+def text_cell(text: str, width: int, left: bool = False) -> str:
+    """按显示宽度补空格到 width 列，默认右对齐。"""
+    pad = max(0, width - display_width(text))
+    return text + " " * pad if left else " " * pad + text
+
+class StartupProfile:
+    """启动计时：挂在 builtins.__import__ 上统计首次导入的模块，并记录 mark() 标出的启动阶段。"""
+    def __init__(self, min_ms: float = 2.0):
+        self.t0 = time.perf_counter(); self.min_ms = min_ms
+        self.marks: List[Tuple[str, float]] = []
+        self.imports: List[List] = []  # [深度, 模块名, 耗时]，按开始顺序排列
+        self._depth, self._orig_import = 0, None
+
+    def install(self):
+        global _active_profile
+        _active_profile = self; self._orig_import = builtins.__import__; builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._orig_import: builtins.__import__ = self._orig_import; self._orig_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules: return self._orig_import(name, globals, locals, fromlist, level)
+        rec = [self._depth, name, 0.0]; self.imports.append(rec)
+        self._depth += 1; t = time.perf_counter()
+        try: return self._orig_import(name, globals, locals, fromlist, level)
+        finally: rec[2] = time.perf_counter() - t; self._depth -= 1
+
+    def mark(self, label: str): self.marks.append((label, time.perf_counter()))
+
+    def record_lazy(self, name: str, seconds: float):
+        print(f"[启动计时] 延迟导入 {name}: {seconds * 1000:.1f} ms", file=sys.stderr, flush=True)
+
+    def report(self, file=None):
+        """打印导入耗时（只列出超过 min_ms 的）和各阶段耗时；之后停止统计导入，延迟导入仍会单独打印。"""
+        file = file or sys.stderr; self.uninstall()
+        print("[启动计时] 模块导入（含子模块）:", file=file)
+        for depth, name, dt in self.imports:
+            if dt * 1000 >= self.min_ms and depth <= 3: print(f"  {'  ' * depth}{name:<{40 - 2 * depth}} {dt * 1000:8.1f} ms", file=file)
+        print("[启动计时] 阶段:", file=file)
+        prev = self.t0
+        for label, t in self.marks:
+            print(f"  {text_cell(label, 23, True)}  {(t - prev) * 1000:8.1f} ms   累计 {(t - self.t0) * 1000:8.1f} ms", file=file); prev = t
+        file.flush()
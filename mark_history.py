@@ -0,0 +1,81 @@
+# mark_history.py
+"""
+标记的撤销/重做历史。每一步只记录被切换的像素线性位置 (y * W + x)，切换是自逆的，
+撤销和重做都是把同一批位置再翻转一次。位置按两种方式压缩，取较小的一种：
+    游程：连续位置合并成 (起点, 长度)，矩形/整行这类批量操作只占每行 8 字节
+    位集：从最小位置到最大位置的位图，适合分布零散但密集的批量操作
+历史总占用超过 limit_bytes 时丢弃最早的步骤，内存不会随项目尺寸或操作次数无限增长。
+"""
+from __future__ import annotations
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+class MarkDelta:
+    """一步操作切换过的像素位置（已去重、升序）。"""
+    def __init__(self, positions: np.ndarray, label: str = ""):
+        pos = np.asarray(positions, dtype=np.int64)
+        if len(pos) > 1 and not (pos[1:] > pos[:-1]).all(): pos = np.unique(pos)  # 调用方通常已按升序给出（nonzero 的结果），省掉排序
+        self.label, self.count = label, len(pos)
+        self._dtype = np.uint32 if not len(pos) or pos[-1] < 1 << 32 else np.uint64
+        self._runs: Optional[Tuple[np.ndarray, np.ndarray]] = None; self._bits: Optional[Tuple[int, np.ndarray]] = None
+        if not len(pos): self._runs = (pos.astype(self._dtype), pos.astype(np.uint32)); return
+        breaks = np.flatnonzero(np.diff(pos) != 1) + 1
+        starts = pos[np.concatenate([[0], breaks])]; lengths = np.diff(np.concatenate([[0], breaks, [len(pos)]]))
+        lo, span = int(pos[0]), int(pos[-1] - pos[0] + 1)
+        if len(starts) * (np.dtype(self._dtype).itemsize + 4) <= (span + 7) // 8: self._runs = (starts.astype(self._dtype), lengths.astype(np.uint32))
+        else:
+            bits = np.zeros(span, dtype=bool); bits[pos - lo] = True
+            self._bits = (lo, np.packbits(bits))
+
+    @property
+    def nbytes(self) -> int:
+        if self._runs is not None: return self._runs[0].nbytes + self._runs[1].nbytes
+        return self._bits[1].nbytes
+
+    def positions(self) -> np.ndarray:
+        if self._bits is not None:
+            lo, packed = self._bits
+            return (np.flatnonzero(np.unpackbits(packed)) + lo).astype(self._dtype)
+        starts, lengths = self._runs
+        if not len(starts): return starts
+        # 把每段 [start, start + length) 展开：先全部填 1，再在每段开头跳到该段起点
+        steps = np.ones(int(lengths.sum()), dtype=np.int64)
+        heads = np.concatenate([[0], np.cumsum(lengths[:-1], dtype=np.int64)])
+        steps[0] = starts[0]; steps[heads[1:]] = starts[1:].astype(np.int64) - (starts[:-1].astype(np.int64) + lengths[:-1] - 1)
+        return np.cumsum(steps).astype(self._dtype)
+
+class MarkHistory:
+    def __init__(self, limit_bytes: int = 32 << 20, limit_steps: int = 10000):
+        self.limit_bytes, self.limit_steps = limit_bytes, limit_steps
+        self._undo: List[MarkDelta] = []; self._redo: List[MarkDelta] = []; self._bytes = 0
+
+    def clear(self): self._undo.clear(); self._redo.clear(); self._bytes = 0
+
+    def push(self, positions: np.ndarray, label: str = ""):
+        """记录新的一步；会清空重做栈。"""
+        delta = MarkDelta(positions, label)
+        if not delta.count: return
+        self._bytes -= sum(d.nbytes for d in self._redo); self._redo.clear()
+        self._undo.append(delta); self._bytes += delta.nbytes
+        while self._undo and (self._bytes > self.limit_bytes or len(self._undo) > self.limit_steps):
+            self._bytes -= self._undo.pop(0).nbytes
+
+    def can_undo(self) -> bool: return bool(self._undo)
+    def can_redo(self) -> bool: return bool(self._redo)
+    def undo_label(self) -> str: return self._undo[-1].label if self._undo else ""
+    def redo_label(self) -> str: return self._redo[-1].label if self._redo else ""
+
+    def undo(self) -> Optional[MarkDelta]:
+        """弹出最近一步并移入重做栈，返回需要再翻转一次的位置；没有可撤销的步骤时返回 None。"""
+        if not self._undo: return None
+        delta = self._undo.pop(); self._redo.append(delta)
+        return delta
+
+    def redo(self) -> Optional[MarkDelta]:
+        if not self._redo: return None
+        delta = self._redo.pop(); self._undo.append(delta)
+        return delta
+
+    @property
+    def nbytes(self) -> int: return self._bytes
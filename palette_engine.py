@@ -0,0 +1,81 @@
+# palette_engine.py
+"""基于 NumPy 的调色板映射引擎：批量最近色查找（RGB / CIELAB / OKLab），按调色板内容缓存 RGB→索引查找表。"""
+from __future__ import annotations
+from typing import Tuple, Sequence
+from functools import lru_cache
+
+import numpy as np
+
+COLOR_SPACES = ["RGB", "CIELAB", "OKLab"]
+_CHUNK = 1 << 20  # 每批处理的颜色数，限制临时距离矩阵的内存
+
+# -------------------- 色彩空间转换 --------------------
+
+def _srgb_to_linear(rgb: np.ndarray) -> np.ndarray:
+    c = rgb / 255.0
+    return np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+
+def rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """sRGB (0-255, 形状 ...×3) → CIELAB (D65)。"""
+    lin = _srgb_to_linear(np.asarray(rgb, dtype=np.float64))
+    m = np.array([[0.4124564, 0.3575761, 0.1804375], [0.2126729, 0.7151522, 0.0721750], [0.0193339, 0.1191920, 0.9503041]])
+    xyz = lin @ m.T / np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+def rgb_to_oklab(rgb: np.ndarray) -> np.ndarray:
+    """sRGB (0-255, 形状 ...×3) → OKLab。"""
+    lin = _srgb_to_linear(np.asarray(rgb, dtype=np.float64))
+    m1 = np.array([[0.4122214708, 0.5363325363, 0.0514459929], [0.2119034982, 0.6806995451, 0.1073969566], [0.0883024619, 0.2817188376, 0.6299787005]])
+    m2 = np.array([[0.2104542553, 0.7936177850, -0.0040720468], [1.9779984951, -2.4285922050, 0.4505937099], [0.0259040371, 0.7827717662, -0.8086757660]])
+    return np.cbrt(lin @ m1.T) @ m2.T
+
+def to_color_space(rgb: np.ndarray, space: str) -> np.ndarray:
+    if space == "CIELAB": return rgb_to_lab(rgb)
+    if space == "OKLab": return rgb_to_oklab(rgb)
+    return np.asarray(rgb, dtype=np.float64)
+
+# -------------------- 最近色匹配 --------------------
+
+def _nearest(points: np.ndarray, pal: np.ndarray) -> np.ndarray:
+    # |p - c|² = |p|² - 2 p·c + |c|²，|p|² 对每个像素是常数，可省略
+    d = (pal * pal).sum(axis=1)[None, :] - 2.0 * (points @ pal.T)
+    return d.argmin(axis=1).astype(np.uint8)
+
+class PaletteMatcher:
+    """某个调色板在指定色彩空间下的最近色匹配器；查找表在首次使用时构建。"""
+    def __init__(self, palette: Sequence[Tuple[int, int, int]], space: str = "RGB", bits: int = 6):
+        if space not in COLOR_SPACES: raise ValueError(f"未知的色彩空间: {space}")
+        if not 1 <= bits <= 8: raise ValueError(f"查找表精度应在 1-8 位之间: {bits}")
+        self.palette = np.asarray(palette[:256], dtype=np.uint8).reshape(-1, 3)
+        self.space, self.bits = space, bits
+        self._pal_space = to_color_space(self.palette, space)
+        self._lut: np.ndarray | None = None
+
+    @property
+    def lut(self) -> np.ndarray:
+        """(2^bits)³ 项的 RGB→调色板索引表，每个格子取其中心颜色匹配。"""
+        if self._lut is None:
+            n, shift = 1 << self.bits, 8 - self.bits
+            centers = np.arange(n, dtype=np.float64) * (1 << shift) + ((1 << shift) - 1) / 2.0
+            grid = np.stack(np.meshgrid(centers, centers, centers, indexing="ij"), axis=-1).reshape(-1, 3)
+            grid = to_color_space(grid, self.space)
+            self._lut = np.concatenate([_nearest(grid[i:i + _CHUNK], self._pal_space) for i in range(0, len(grid), _CHUNK)])
+        return self._lut
+
+    def match(self, rgb: np.ndarray) -> np.ndarray:
+        """通过查找表把 H×W×3 的 uint8 数组映射为 H×W 的调色板索引。"""
+        rgb = np.asarray(rgb, dtype=np.uint8)
+        shift = 8 - self.bits
+        r, g, b = rgb[..., 0] >> shift, rgb[..., 1] >> shift, rgb[..., 2] >> shift
+        key = (r.astype(np.int32) << (2 * self.bits)) | (g.astype(np.int32) << self.bits) | b
+        return self.lut[key]
+
+@lru_cache(maxsize=32)
+def _cached_matcher(key: Tuple[Tuple[int, int, int], ...], space: str, bits: int) -> PaletteMatcher:
+    return PaletteMatcher(key, space, bits)
+
+def get_palette_matcher(palette: Sequence[Tuple[int, int, int]], space: str = "RGB", bits: int = 6) -> PaletteMatcher:
+    """按调色板内容缓存匹配器，重复切换调色板时不必重建查找表。"""
+    key = tuple(tuple(int(v) for v in c) for c in palette[:256])
+    return _cached_matcher(key, space, bits)
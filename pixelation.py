@@ -0,0 +1,173 @@
+# pixelation.py
+"""像素化流程核心：调色板预设、缩放、量化。只依赖 PIL/NumPy，图形界面和批量模式共用。"""
+from __future__ import annotations
+from typing import List, Tuple, Optional, Callable, Dict
+from contextlib import contextmanager
+
+import math
+import time
+import colorsys
+
+from PIL import Image
+import numpy as np
+
+from palette_engine import get_palette_matcher
+from dithering import dither
+from indexed_image import IndexedImage
+
+PIPELINE_DOWNSCALE_FIRST, PIPELINE_LEGACY = "先缩放后量化", "旧版(先量化后缩放)"
+DOWNSAMPLERS = ["区域平均", "整数倍缩减"]
+# 显示名称 → dithering 中的抖动方式；名称会写进项目文件，已有的两项不要改名
+DITHER_ALGORITHMS = {"Floyd-Steinberg 抖动": "floyd-steinberg", "Atkinson 抖动": "atkinson", "Jarvis-Judice-Ninke 抖动": "jjn",
+                     "Sierra 抖动": "sierra", "Bayer 有序抖动": "bayer", "蓝噪声抖动": "bluenoise"}
+ALGORITHMS = ["邻近采样"] + list(DITHER_ALGORITHMS)
+LEGACY_PIL_ALGORITHMS = ALGORITHMS[:2]  # 旧版流程下仍由 PIL 量化（固定 RGB、满强度），保证旧项目重新像素化后与标记对得上
+PALETTE_PRESETS = ["wplace", "预设16", "预设32", "预设64"]
+CUSTOM_PALETTE = "自定义…"
+AUTO_PALETTE, AUTO_WPLACE_PALETTE = "自动 N 色…", "自动 N 色 (wplace 子集)…"
+
+class PixelateCancelled(Exception):
+    pass
+
+class StageTimer:
+    """分阶段计时。可直接作为 pixelate_image 的 progress 回调：每个阶段从被报告开始，到下一个阶段开始或 stop() 为止。
+    then 是原本的 progress 回调，计时后照常转发（可在其中抛出 PixelateCancelled）。"""
+    def __init__(self, then: Optional[Callable[[str], None]] = None):
+        self.stages: List[Tuple[str, float]] = []; self._then = then
+        self._current: Optional[str] = None; self._t = 0.0
+
+    def __call__(self, stage: str):
+        self._lap(stage)
+        if self._then: self._then(stage)
+
+    def _lap(self, stage: Optional[str]):
+        t = time.perf_counter()
+        if self._current is not None: self.stages.append((self._current, t - self._t))
+        self._current, self._t = stage, t
+
+    def stop(self): self._lap(None)
+
+    @contextmanager
+    def measure(self, stage: str):
+        """单独计时一段不经过 progress 回调的代码（如界面线程上的 QImage/QPixmap 转换）。"""
+        self._lap(stage)
+        try: yield
+        finally: self.stop()
+
+    def as_dict(self) -> Dict[str, float]:
+        """阶段 → 秒，同名阶段累加，按首次出现的顺序。"""
+        out: Dict[str, float] = {}
+        for name, dt in self.stages: out[name] = out.get(name, 0.0) + dt
+        return out
+
+    @property
+    def total(self) -> float: return sum(dt for _, dt in self.stages)
+
+    def summary(self) -> str:
+        return " | ".join(f"{name} {dt * 1000:.1f} ms" for name, dt in self.as_dict().items()) + f" | 合计 {self.total * 1000:.1f} ms"
+
+def build_even_hsv_palette(n: int) -> List[Tuple[int, int, int]]:
+    if n <= 0: return [(0, 0, 0)]
+    out = []
+    rows = 2 if n > 16 else 1
+    per_row = math.ceil(n / rows)
+    for r in range(rows):
+        v = 0.8 - r * 0.25
+        for i in range(per_row):
+            h, s = (i / per_row), 0.75
+            rgb = colorsys.hsv_to_rgb(h, s, v)
+            out.append(tuple(int(255 * x) for x in rgb))
+            if len(out) >= n: return out
+    return out
+    
+def downscale_image(img: Image.Image, W: int, H: int, method: str = "区域平均") -> Image.Image:
+    """先把图片缩小到 W×H：区域平均直接按盒式滤波采样，整数倍缩减先用 reduce 快速缩小再补齐到目标尺寸。"""
+    if method == "整数倍缩减":
+        factor = max(1, min(img.width // W, img.height // H))
+        if factor > 1: img = img.reduce(factor)
+    if img.size == (W, H): return img
+    return img.resize((W, H), Image.Resampling.BOX)
+
+def build_palette_image(palette: List[Tuple[int,int,int]]) -> Image.Image:
+    # 用第一种颜色补齐 256 项，避免量化时误选补位的黑色
+    flat = [c for rgb in palette[:256] for c in rgb]
+    if len(flat) < 256 * 3: flat.extend(list(palette[0]) * (256 - len(flat) // 3))
+    pal_img = Image.new('P', (1, 1)); pal_img.putpalette(flat)
+    return pal_img
+
+def pixelate_image(img: Image.Image, W: int, H: int, alg_name: str, palette: List[Tuple[int,int,int]],
+                   pipeline: str = PIPELINE_DOWNSCALE_FIRST, downsampler: str = "区域平均", metric: str = "RGB",
+                   strength: float = 1.0, progress: Optional[Callable[[str], None]] = None,
+                   cancelled: Optional[Callable[[], bool]] = None) -> IndexedImage:
+    """像素化流程本体，不依赖窗口；strength 为抖动强度 (0-1)。progress 在每个阶段开始时被调用，可在其中抛出 PixelateCancelled 中止；
+    cancelled 在耗时的误差扩散中被反复询问，返回 True 时抛出 PixelateCancelled。"""
+    report = progress or (lambda stage: None)
+    check = _cancel_check(cancelled)
+    method = DITHER_ALGORITHMS.get(alg_name)
+    if pipeline == PIPELINE_LEGACY:
+        # 旧流程：在原图分辨率上量化/抖动后再邻近缩放，仅保留用于对比。LEGACY_PIL_ALGORITHMS 忽略 metric 与 strength
+        report("转换"); rgb_img = img.convert("RGB")
+        report("量化")
+        if method in (None, "floyd-steinberg"):
+            pil_dither = Image.Dither.FLOYDSTEINBERG if method else Image.Dither.NONE
+            idx = _indexed_from_quantized(rgb_img.quantize(palette=build_palette_image(palette), dither=pil_dither), palette).indices
+        else: idx = dither(np.asarray(rgb_img), palette, method, strength, metric, check=check)
+        report("缩放"); return IndexedImage(np.asarray(Image.fromarray(np.ascontiguousarray(idx)).resize((W, H), Image.Resampling.NEAREST)), palette)
+    # 先缩小到 W×H，再在输出尺寸上映射调色板与抖动
+    report("转换"); src = img if img.mode in ("RGB", "L") else img.convert("RGB")
+    report("缩放"); small = np.asarray(downscale_image(src, W, H, downsampler).convert("RGB"))
+    report("量化")
+    if method: return IndexedImage(_dither(small, palette, method, strength, metric, check=check), palette)
+    return IndexedImage(get_palette_matcher(palette, metric).match(small), palette)
+
+def _cancel_check(cancelled: Optional[Callable[[], bool]]) -> Optional[Callable[[], None]]:
+    if cancelled is None: return None
+    def check():
+        if cancelled(): raise PixelateCancelled()
+    return check
+
+def _dither(rgb: np.ndarray, palette: List[Tuple[int,int,int]], method: str, strength: float, metric: str, **kw) -> np.ndarray:
+    # 满强度、RGB 度量的 Floyd-Steinberg 沿用 PIL 内置的 C 实现（也是加入抖动引擎前的行为），比 NumPy 波前快一个数量级
+    if method == "floyd-steinberg" and strength >= 1 and metric == "RGB":
+        return _indexed_from_quantized(Image.fromarray(rgb).quantize(palette=build_palette_image(palette), dither=Image.Dither.FLOYDSTEINBERG), palette).indices
+    return dither(rgb, palette, method, strength, metric, **kw)
+
+def pixelate_region(src: Image.Image, W: int, H: int, box: Tuple[int, int, int, int], alg_name: str, palette: List[Tuple[int,int,int]],
+                    metric: str = "RGB", strength: float = 1.0) -> np.ndarray:
+    """只生成 W×H 输出中 box = (x0, y0, x1, y1) 这一块的索引，供超大画布逐瓦片像素化。
+    按先缩放后量化、区域平均处理；块边缘的采样舍入可能与整幅缩放略有出入，误差扩散也不会跨块传播。src 应已是 RGB/L。"""
+    x0, y0, x1, y1 = box; fx, fy = src.width / W, src.height / H
+    small = np.asarray(src.resize((x1 - x0, y1 - y0), Image.Resampling.BOX, box=(x0 * fx, y0 * fy, x1 * fx, y1 * fy)).convert("RGB"))
+    method = DITHER_ALGORITHMS.get(alg_name)
+    if method: return _dither(small, palette, method, strength, metric, origin=(x0, y0))
+    return get_palette_matcher(palette, metric).match(small)
+
+def _indexed_from_quantized(img: Image.Image, palette: List[Tuple[int,int,int]]) -> IndexedImage:
+    idx = np.array(img, dtype=np.uint8)
+    idx[idx >= min(len(palette), 256)] = 0  # 补位项与第一种颜色相同
+    return IndexedImage(idx, palette)
+
+def hex_to_rgb(hex_str):
+    h = hex_str.lstrip('#')
+    return tuple(int(h[i:i+2], 16) for i in (0, 2, 4))
+
+def parse_hex_palette(text: str) -> List[Tuple[int, int, int]]:
+    """解析用逗号/空格分隔的 #RRGGBB 列表，忽略无法识别的项。"""
+    cols = []
+    for token in text.replace(',', ' ').split():
+        s = token.strip().lstrip('#')
+        if len(s) == 6:
+            try: cols.append(tuple(int(s[i:i+2], 16) for i in (0, 2, 4)))
+            except Exception: pass
+    return cols
+
+PRESET_16 = [(0,0,0),(255,255,255),(190,38,51),(224,111,139),(73,60,43),(164,100,34),(235,137,49),(247,226,107),(47,72,78),(68,137,26),(163,206,39),(27,38,50),(0,87,132),(49,162,242),(178,220,239),(58,175,169)]
+WPLACE_PALETTE_HEX = ["000000","3c3c3c","787878","d2d2d2","ffffff","600018","ed1c24","ff7f27","f6aa09","f9dd3b","fffabc","0eb968","13e67b","87ff5e","0c816e","10aea6","13e1be","28509e","4093e4","60f7f2","6b50f6","99b1fb","780c99","aa38b9","e09ff9","cb007a","ec1f80","f38da9","684634","95682a","f8b277"]
+WPLACE_PALETTE = [hex_to_rgb(h) for h in WPLACE_PALETTE_HEX]
+
+def preset_palette(name: str) -> List[Tuple[int, int, int]]:
+    if name == "wplace": return WPLACE_PALETTE.copy()
+    if name == "预设16": return PRESET_16.copy()
+    if name == "预设32": return build_even_hsv_palette(32)
+    if name == "预设64": return build_even_hsv_palette(64)
+    raise ValueError(f"未知的调色板预设: {name}")
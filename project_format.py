@@ -0,0 +1,128 @@
+# project_format.py
+"""
+.wpp 项目文件的读写。
+
+v1：JSON 文本，只记录原图路径、像素化参数和 [x, y] 标记列表，加载时需要原图重新像素化。
+v2：zip 容器，包含
+    project.json  版本、尺寸、调色板、像素化参数、自动保存日志 id
+    indices.bin   H×W 的 uint8 调色板索引（像素化结果本身）
+    marks.bin     np.packbits 位压缩后的标记位图
+  各成员用 deflate 压缩，标记位图中大片连续的 0/1 会被压得很小；加载时既不需要原图，也不用重新像素化。
+
+自动保存日志（<项目路径>.journal）：以 b"WPJ1" + 16 字节日志 id 开头，之后每条记录是一个小端 uint32
+像素线性位置 (y * W + x)，表示该像素的标记被切换一次。日志 id 与 project.json 中一致时才会回放。
+"""
+from __future__ import annotations
+from typing import List, Tuple, Optional, Dict, Any
+import os
+import json
+import uuid
+import zipfile
+
+import numpy as np
+
+from indexed_image import IndexedImage
+
+PROJECT_VERSION = "2.0"
+JOURNAL_MAGIC = b"WPJ1"
+
+class ProjectFormatError(Exception):
+    pass
+
+class Project:
+    """加载/保存时在 GUI 与文件之间传递的项目内容。v1 文件没有 model 和 mark_mask，只有 marked_pixels。"""
+    def __init__(self, settings: Dict[str, Any], source_image_path: Optional[str] = None, model: Optional[IndexedImage] = None,
+                 mark_mask: Optional[np.ndarray] = None, marked_pixels: Optional[List[Tuple[int, int]]] = None,
+                 version: str = PROJECT_VERSION, journal_id: Optional[str] = None):
+        self.settings, self.source_image_path, self.version = settings, source_image_path, version
+        self.model, self.mark_mask, self.marked_pixels, self.journal_id = model, mark_mask, marked_pixels, journal_id
+
+def journal_path(path: str) -> str: return str(path) + ".journal"
+
+# -------------------- 读写 --------------------
+
+def save_project(path: str, project: Project) -> str:
+    """以 v2 格式保存（先写临时文件再替换，避免写到一半损坏原文件），返回新的日志 id。"""
+    model, mask = project.model, project.mark_mask
+    if model is None or mask is None: raise ProjectFormatError("v2 项目需要像素化结果与标记位图")
+    journal_id = uuid.uuid4().hex
+    meta = {"version": PROJECT_VERSION, "width": model.width, "height": model.height, "palette": [list(c) for c in model.palette],
+            "source_image_path": project.source_image_path, "pixelization_settings": project.settings, "journal_id": journal_id}
+    tmp = str(path) + ".tmp"
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("project.json", json.dumps(meta, ensure_ascii=False))
+        zf.writestr("indices.bin", np.ascontiguousarray(model.indices).tobytes())
+        zf.writestr("marks.bin", np.packbits(mask, axis=None).tobytes())
+    os.replace(tmp, path)
+    return journal_id
+
+def load_project(path: str) -> Project:
+    with open(path, "rb") as f: head = f.read(4)
+    if head.startswith(b"PK"): return _load_v2(path)
+    return _load_v1(path)
+
+def _load_v1(path: str) -> Project:
+    with open(path, "r", encoding="utf-8") as f: data = json.load(f)
+    return Project(data["pixelization_settings"], data.get("source_image_path"), marked_pixels=[tuple(p) for p in data["marked_pixels"]],
+                   version=str(data.get("version", "1.0")))
+
+def _load_v2(path: str) -> Project:
+    with zipfile.ZipFile(path) as zf:
+        meta = json.loads(zf.read("project.json").decode("utf-8"))
+        if int(str(meta.get("version", "0")).split(".")[0]) != 2: raise ProjectFormatError(f"不支持的项目版本: {meta.get('version')}")
+        w, h = int(meta["width"]), int(meta["height"])
+        indices = np.frombuffer(zf.read("indices.bin"), dtype=np.uint8)
+        bits = np.frombuffer(zf.read("marks.bin"), dtype=np.uint8)
+    if indices.size != w * h: raise ProjectFormatError("像素数据与尺寸不符")
+    model = IndexedImage(indices.reshape(h, w), [tuple(c) for c in meta["palette"]])
+    mask = np.unpackbits(bits, count=w * h).astype(bool).reshape(h, w)
+    return Project(meta["pixelization_settings"], meta.get("source_image_path"), model, mask, version=meta["version"], journal_id=meta.get("journal_id"))
+
+# -------------------- 自动保存日志 --------------------
+
+def replay_journal(path: str, project: Project) -> int:
+    """把与该项目匹配的日志回放到 project.mark_mask 上，返回回放的切换次数；日志不存在或不匹配时返回 0。"""
+    jpath = journal_path(path)
+    if project.mark_mask is None or not project.journal_id or not os.path.exists(jpath): return 0
+    with open(jpath, "rb") as f: data = f.read()
+    if data[:20] != _journal_header(project.journal_id): return 0
+    body = data[20:]; body = body[:len(body) // 4 * 4]  # 崩溃时可能留下半条记录
+    pos = np.frombuffer(body, dtype="<u4")
+    mask = project.mark_mask.reshape(-1)
+    pos = pos[pos < mask.size]
+    # 同一像素切换偶数次等于没变，只翻转奇数次的
+    if len(pos): mask ^= (np.bincount(pos, minlength=mask.size) & 1).astype(bool)
+    return len(pos)
+
+def _journal_header(journal_id: str) -> bytes: return JOURNAL_MAGIC + uuid.UUID(journal_id).bytes
+
+class MarkJournal:
+    """只追加的标记切换日志。每次切换写 4 字节并 flush，开销远小于重写整个项目。"""
+    def __init__(self, path: str, journal_id: str, fresh: bool):
+        self.path = journal_path(path)
+        self._f = open(self.path, "wb" if fresh else "ab")
+        if fresh: self._f.write(_journal_header(journal_id)); self._f.flush()
+
+    @classmethod
+    def start(cls, path: str, journal_id: str) -> "MarkJournal": return cls(path, journal_id, fresh=True)
+    @classmethod
+    def resume(cls, path: str, journal_id: str) -> "MarkJournal":
+        """继续追加到已回放过的日志；日志缺失或属于别的保存版本时重新开始。"""
+        jpath = journal_path(path)
+        try:
+            with open(jpath, "rb") as f: matches = f.read(20) == _journal_header(journal_id)
+            # 崩溃时写了一半的最后一条记录要截掉，否则之后追加的记录全部错位
+            if matches: size = os.path.getsize(jpath); os.truncate(jpath, size - (size - 20) % 4)
+        except OSError: matches = False
+        return cls(path, journal_id, fresh=not matches)
+
+    def append(self, positions: np.ndarray):
+        self._f.write(np.asarray(positions, dtype="<u4").tobytes()); self._f.flush()
+
+    def close(self):
+        if not self._f.closed: self._f.close()
+
+    def discard(self):
+        self.close()
+        try: os.remove(self.path)
+        except OSError: pass
@@ -0,0 +1,174 @@
+# tiled_canvas.py
+"""
+超大画布项目（.wpt）：作品按 wplace 画布的 1000×1000 瓦片网格切分，调色板索引与标记位图都放在
+内存映射的文件区域里。打开项目只建立映射，像素按需由操作系统分页读入，常驻内存与画布总尺寸无关。
+
+文件布局：
+    b"WPT1" + 小端 uint32 JSON 长度 + JSON（尺寸、原点、调色板、像素化参数），整个头部占 HEADER_SIZE 字节
+    索引区  tiles_y × tiles_x × 1000 × 1000 个 uint8，每个瓦片的 100 万个像素连续存放
+    标记区  tiles_y × tiles_x × 1000 × 125 字节，瓦片内每行 1000 个标记按位压缩成 125 字节
+origin 是作品左上角在整个画布上的绝对像素坐标，瓦片 (i, j) 对应画布瓦片 (grid_x + i, grid_y + j)；
+作品边缘没有对齐瓦片网格时，瓦片里落在作品外的部分不使用。对外的坐标一律是作品坐标 (0..W, 0..H)。
+"""
+from __future__ import annotations
+from typing import List, Tuple, Optional, Dict, Any, Callable, Iterator
+
+import os
+import json
+import struct
+
+import numpy as np
+from PIL import Image
+
+from project_format import ProjectFormatError
+from pixelation import pixelate_region
+
+TILE = 1000
+MAGIC = b"WPT1"
+HEADER_SIZE = 1 << 16
+
+class TiledCanvas:
+    def __init__(self, path: str, meta: Dict[str, Any], writable: bool = True):
+        self.path, self.meta = str(path), meta
+        self.width, self.height = int(meta["width"]), int(meta["height"])
+        self.origin: Tuple[int, int] = tuple(meta["origin"])
+        self.palette: List[Tuple[int, int, int]] = [tuple(c) for c in meta["palette"]]
+        self.settings: Dict[str, Any] = meta.get("pixelization_settings", {})
+        self.grid_x, self.grid_y = self.origin[0] // TILE, self.origin[1] // TILE
+        self.shift_x, self.shift_y = self.origin[0] - self.grid_x * TILE, self.origin[1] - self.grid_y * TILE  # 作品左上角在首个瓦片内的位置
+        self.tiles_x, self.tiles_y = -(-(self.shift_x + self.width) // TILE), -(-(self.shift_y + self.height) // TILE)
+        n, mode = self.tiles_x * self.tiles_y, "r+" if writable else "r"
+        self.indices = np.memmap(self.path, np.uint8, mode, HEADER_SIZE, (self.tiles_y, self.tiles_x, TILE, TILE))
+        self.marks = np.memmap(self.path, np.uint8, mode, HEADER_SIZE + n * TILE * TILE, (self.tiles_y, self.tiles_x, TILE, TILE // 8))
+
+    # ---- 创建与打开 ----
+    @classmethod
+    def create(cls, path: str, width: int, height: int, origin: Tuple[int, int], palette, settings: Dict[str, Any]) -> "TiledCanvas":
+        """创建空白画布文件。文件用 truncate 一次性扩到最终大小，未写入的区域在多数文件系统上不占磁盘。"""
+        if width < 1 or height < 1: raise ValueError("画布尺寸必须为正")
+        meta = {"version": "1.0", "width": width, "height": height, "origin": list(origin), "palette": [list(c) for c in palette[:256]],
+                "pixelization_settings": settings}
+        gx, gy = origin[0] // TILE, origin[1] // TILE
+        n = -(-(origin[0] - gx * TILE + width) // TILE) * -(-(origin[1] - gy * TILE + height) // TILE)
+        with open(path, "wb") as f:
+            f.write(_header_bytes(meta)); f.truncate(HEADER_SIZE + n * TILE * TILE + n * TILE * TILE // 8)
+        return cls(path, meta)
+
+    @classmethod
+    def open(cls, path: str, writable: bool = True) -> "TiledCanvas":
+        with open(path, "rb") as f: head = f.read(HEADER_SIZE)
+        if head[:4] != MAGIC: raise ProjectFormatError("不是大画布项目文件")
+        (size,) = struct.unpack("<I", head[4:8])
+        return cls(path, json.loads(head[8:8 + size].decode("utf-8")), writable)
+
+    def save_meta(self, settings: Optional[Dict[str, Any]] = None):
+        if settings is not None: self.meta["pixelization_settings"] = self.settings = settings
+        with open(self.path, "r+b") as f: f.write(_header_bytes(self.meta))
+        self.flush()
+
+    def flush(self): self.indices.flush(); self.marks.flush()
+
+    def close(self):
+        self.flush(); del self.indices, self.marks  # 释放映射，Windows 上否则文件会一直被占用
+
+    # ---- 几何 ----
+    def tiles(self) -> Iterator[Tuple[int, int]]:
+        for j in range(self.tiles_y):
+            for i in range(self.tiles_x): yield i, j
+
+    def tile_rect(self, i: int, j: int) -> Tuple[int, int, int, int]:
+        """瓦片 (i, j) 落在作品内的部分，作品坐标 (x0, y0, x1, y1)。"""
+        x0, y0 = i * TILE - self.shift_x, j * TILE - self.shift_y
+        return max(0, x0), max(0, y0), min(self.width, x0 + TILE), min(self.height, y0 + TILE)
+
+    def tiles_in(self, x0: int, y0: int, x1: int, y1: int) -> List[Tuple[int, int]]:
+        """与作品矩形 [x0, x1) × [y0, y1) 相交的瓦片。"""
+        x0, y0, x1, y1 = max(0, x0), max(0, y0), min(self.width, x1), min(self.height, y1)
+        if x0 >= x1 or y0 >= y1: return []
+        i0, i1 = (x0 + self.shift_x) // TILE, (x1 - 1 + self.shift_x) // TILE
+        j0, j1 = (y0 + self.shift_y) // TILE, (y1 - 1 + self.shift_y) // TILE
+        return [(i, j) for j in range(j0, j1 + 1) for i in range(i0, i1 + 1)]
+
+    def _locate(self, x: int, y: int) -> Tuple[int, int, int, int]:
+        u, v = x + self.shift_x, y + self.shift_y
+        return u // TILE, v // TILE, u % TILE, v % TILE
+
+    def _local(self, i: int, j: int) -> Tuple[slice, slice]:
+        x0, y0, x1, y1 = self.tile_rect(i, j)
+        u0, v0 = x0 + self.shift_x - i * TILE, y0 + self.shift_y - j * TILE
+        return slice(v0, v0 + y1 - y0), slice(u0, u0 + x1 - x0)
+
+    # ---- 按瓦片读写 ----
+    def tile_indices(self, i: int, j: int) -> np.ndarray:
+        """瓦片 (i, j) 在作品内部分的索引（内存映射视图，不拷贝）。"""
+        rows, cols = self._local(i, j)
+        return self.indices[j, i, rows, cols]
+
+    def tile_marks(self, i: int, j: int) -> np.ndarray:
+        """瓦片 (i, j) 在作品内部分的标记，解压成布尔数组。"""
+        rows, cols = self._local(i, j)
+        return np.unpackbits(self.marks[j, i, rows], axis=1, count=TILE)[:, cols].astype(bool)
+
+    def region_marks(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        """作品矩形区域的标记（跨瓦片拼接），用于绘制视口内的叉号。"""
+        out = np.zeros((max(0, y1 - y0), max(0, x1 - x0)), dtype=bool)
+        for i, j in self.tiles_in(x0, y0, x1, y1):
+            tx0, ty0, tx1, ty1 = self.tile_rect(i, j)
+            cx0, cy0, cx1, cy1 = max(x0, tx0), max(y0, ty0), min(x1, tx1), min(y1, ty1)
+            out[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0] = self.tile_marks(i, j)[cy0 - ty0:cy1 - ty0, cx0 - tx0:cx1 - tx0]
+        return out
+
+    # ---- 单像素 ----
+    def index_at(self, x: int, y: int) -> int:
+        i, j, u, v = self._locate(x, y)
+        return int(self.indices[j, i, v, u])
+
+    def hex_at(self, x: int, y: int) -> str: return "#%02X%02X%02X" % self.palette[self.index_at(x, y)]
+
+    def flip_marks(self, xs: np.ndarray, ys: np.ndarray):
+        """批量切换一组互不重复的像素的标记，逐个涉及的瓦片解压、翻转、压回。"""
+        u, v = np.asarray(xs, dtype=np.int64) + self.shift_x, np.asarray(ys, dtype=np.int64) + self.shift_y
+        ti, tj = u // TILE, v // TILE
+        for i, j in set(zip(ti.tolist(), tj.tolist())):
+            sel = (ti == i) & (tj == j)
+            bits = np.unpackbits(self.marks[j, i], axis=1, count=TILE)
+            bits[v[sel] % TILE, u[sel] % TILE] ^= 1
+            self.marks[j, i] = np.packbits(bits, axis=1)
+
+    # ---- 导出 ----
+    def tile_image(self, i: int, j: int) -> Image.Image:
+        """完整的 1000×1000 RGBA 瓦片图，作品以外的部分透明，坐标与 wplace 瓦片一致。"""
+        rgba = np.zeros((TILE, TILE, 4), dtype=np.uint8)
+        rows, cols = self._local(i, j)
+        rgba[rows, cols, :3] = np.asarray(self.palette, dtype=np.uint8)[self.tile_indices(i, j)]; rgba[rows, cols, 3] = 255
+        return Image.fromarray(rgba, "RGBA")
+
+    def export_tiles(self, out_dir: str) -> List[str]:
+        """按画布瓦片坐标导出为 <out_dir>/<X>_<Y>.png。"""
+        os.makedirs(out_dir, exist_ok=True); files = []
+        for i, j in self.tiles():
+            files.append(os.path.join(out_dir, f"{self.grid_x + i}_{self.grid_y + j}.png")); self.tile_image(i, j).save(files[-1])
+        return files
+
+def _header_bytes(meta: Dict[str, Any]) -> bytes:
+    body = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+    if len(body) + 8 > HEADER_SIZE: raise ProjectFormatError("项目头部过大")
+    return (MAGIC + struct.pack("<I", len(body)) + body).ljust(HEADER_SIZE, b"\0")
+
+def build_tiled_canvas(path: str, img: Image.Image, width: int, height: int, origin: Tuple[int, int], alg_name: str,
+                       palette, metric: str, strength: float, settings: Dict[str, Any],
+                       progress: Optional[Callable[[int, int], None]] = None) -> TiledCanvas:
+    """逐瓦片像素化原图写进新的 .wpt 文件，同一时刻只有一个瓦片的中间数据在内存里。
+    progress(已完成, 总数) 在每个瓦片前后调用，可在其中抛异常中止。"""
+    canvas = TiledCanvas.create(path, width, height, origin, palette, settings)
+    src = img if img.mode in ("RGB", "L") else img.convert("RGB")
+    tiles = list(canvas.tiles())
+    try:
+        for n, (i, j) in enumerate(tiles):
+            if progress: progress(n, len(tiles))
+            canvas.tile_indices(i, j)[...] = pixelate_region(src, width, height, canvas.tile_rect(i, j), alg_name, palette, metric, strength)
+        canvas.flush()
+        if progress: progress(len(tiles), len(tiles))
+    except BaseException:
+        canvas.close(); raise  # 先释放映射，调用方才能删掉生成到一半的文件（Windows 上被映射的文件删不掉）
+    return canvas